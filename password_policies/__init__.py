@@ -1,3 +1,11 @@
 VERSION = (0, 8, 6)
 
 __version__ = "%s.%s.%s" % VERSION
+
+try:
+    import django
+except ImportError:  # pragma: no cover, e.g. when building the package
+    django = None
+
+if django is not None and django.VERSION < (3, 2):
+    default_app_config = "password_policies.apps.PasswordPoliciesConfig"
@@ -10,8 +10,7 @@ from password_policies.models import PasswordChangeRequired, PasswordHistory
 
 
 def force_password_change(modeladmin, request, queryset):
-    for user in queryset.all():
-        PasswordChangeRequired.objects.create(user=user)
+    PasswordChangeRequired.objects.enforce_many(queryset.all())
 
     force_password_change.short_description = _(
         "Force password change for selected" " users"
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class PasswordPoliciesConfig(AppConfig):
     name = "password_policies"
+
+    def ready(self):
+        from password_policies import checks  # noqa: F401
+        from password_policies.conf import settings
+
+        if settings.PASSWORD_DICTIONARY_PRELOAD:
+            from password_policies.forms.validators import validate_dictionary_words
+
+            # Accessing the index loads it.
+            validate_dictionary_words.index
@@ -0,0 +1,189 @@
+import logging
+import time
+
+from django.core.cache import caches
+
+from password_policies.conf import settings
+from password_policies.managers import PasswordStatus
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache():
+    """
+    Returns the cache used to share password states between processes,
+    as configured by
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_CACHE_ALIAS`."""
+    return caches[settings.PASSWORD_CACHE_ALIAS]
+
+
+def uses_status_version():
+    """
+    Checks if password status versions are used, i.e. if either
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_USE_STATUS_CACHE`
+    or :py:attr:`~password_policies.conf.Settings.PASSWORD_CHECK_SECONDS`
+    is set.
+
+    :rtype: bool"""
+    return bool(settings.PASSWORD_USE_STATUS_CACHE or settings.PASSWORD_CHECK_SECONDS)
+
+
+def get_status_version_key(user_id):
+    "Returns the cache key of a user's password status version."
+    return "password_policies:status_version:%s" % user_id
+
+
+def get_initial_status_version():
+    """
+    Returns the version a user's password status starts with.
+
+    Versions are seeded with the current time in nanoseconds instead of
+    ``0``, so a version evicted from the cache (or lost on a restart of
+    the cache) is never reused and stale cached states are not picked up
+    again.
+
+    :rtype: int"""
+    return time.time_ns()
+
+
+def get_status_version(user_id):
+    """
+    Gets the version of a user's password status.
+
+    The version is increased each time the password status of a user is
+    modified, e.g. when a password change is enforced. An unknown version
+    is initialized using :func:`get_initial_status_version`.
+
+    :arg user_id: The primary key of a user.
+    :returns: An integer.
+    :rtype: int"""
+    cache = get_cache()
+    key = get_status_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = get_initial_status_version()
+        cache.add(key, version, timeout=None)
+        # Another process may have initialized the version first.
+        version = cache.get(key, version)
+    return version
+
+
+async def aget_status_version(user_id):
+    "Asynchronous version of :func:`get_status_version`."
+    cache = get_cache()
+    key = get_status_version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = get_initial_status_version()
+        await cache.aadd(key, version, timeout=None)
+        version = await cache.aget(key, version)
+    return version
+
+
+def get_status_key(user_id, version):
+    "Returns the cache key of a user's password status."
+    return "password_policies:status:%s:%s" % (user_id, version)
+
+
+def get_cached_status(user_id, version):
+    """
+    Gets a cached password status.
+
+    :arg user_id: The primary key of a user.
+    :arg int version: The version of the password status.
+    :returns: A :class:`~password_policies.managers.PasswordStatus` instance
+      if found, ``None`` if not."""
+    value = get_cache().get(get_status_key(user_id, version))
+    if value is None:
+        return None
+    return PasswordStatus(*value)
+
+
+async def aget_cached_status(user_id, version):
+    "Asynchronous version of :func:`get_cached_status`."
+    value = await get_cache().aget(get_status_key(user_id, version))
+    if value is None:
+        return None
+    return PasswordStatus(*value)
+
+
+def set_cached_status(user_id, version, status):
+    """
+    Caches a password status.
+
+    :arg user_id: The primary key of a user.
+    :arg int version: The version of the password status.
+    :arg status: A :class:`~password_policies.managers.PasswordStatus` instance."""
+    get_cache().set(get_status_key(user_id, version), tuple(status))
+
+
+async def aset_cached_status(user_id, version, status):
+    "Asynchronous version of :func:`set_cached_status`."
+    await get_cache().aset(get_status_key(user_id, version), tuple(status))
+
+
+def bump_status_version(user_id):
+    """
+    Increases the version of a user's password status.
+
+    Nothing happens unless status versions are used, see
+    :func:`uses_status_version`. Errors of the cache are logged instead of
+    raised, so the modification of the password status is not lost: the
+    modification is then noticed once the cached status or the result of
+    the last check stored in the session expires.
+
+    :arg user_id: The primary key of a user.
+    :returns: The new version, or ``None`` if status versions are not used
+      or the cache is not available.
+    :rtype: int"""
+    if not uses_status_version():
+        return None
+    try:
+        return _bump_status_version(user_id)
+    except Exception:
+        logger.warning(
+            "Could not update the password status version of user %s.",
+            user_id,
+            exc_info=True,
+        )
+        return None
+
+
+def _bump_status_version(user_id):
+    cache = get_cache()
+    key = get_status_version_key(user_id)
+    cache.add(key, get_initial_status_version(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key has been evicted in the meantime.
+        version = get_initial_status_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+async def abump_status_version(user_id):
+    "Asynchronous version of :func:`bump_status_version`."
+    if not uses_status_version():
+        return None
+    try:
+        return await _abump_status_version(user_id)
+    except Exception:
+        logger.warning(
+            "Could not update the password status version of user %s.",
+            user_id,
+            exc_info=True,
+        )
+        return None
+
+
+async def _abump_status_version(user_id):
+    cache = get_cache()
+    key = get_status_version_key(user_id)
+    await cache.aadd(key, get_initial_status_version(), timeout=None)
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        version = get_initial_status_version()
+        await cache.aset(key, version, timeout=None)
+        return version
@@ -0,0 +1,38 @@
+from django.conf import settings as django_settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+from password_policies.conf import settings
+
+MIDDLEWARE = "password_policies.middleware.PasswordChangeMiddleware"
+
+
+@register()
+def check_password_cache(app_configs, **kwargs):
+    """
+    Warns if the :middleware:`PasswordChangeMiddleware` reuses the results
+    of its checks for
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_CHECK_SECONDS` while
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_CACHE_ALIAS` is not
+    shared by all processes. Enforced password changes would then only be
+    noticed by the process enforcing them."""
+    middleware = getattr(django_settings, "MIDDLEWARE", None) or getattr(
+        django_settings, "MIDDLEWARE_CLASSES", ()
+    )
+    if MIDDLEWARE not in middleware or not settings.PASSWORD_CHECK_SECONDS:
+        return []
+    from password_policies.cache import get_cache
+
+    if not isinstance(get_cache(), (LocMemCache, DummyCache)):
+        return []
+    return [
+        Warning(
+            "PASSWORD_CACHE_ALIAS refers to a cache which is not shared by "
+            "all processes, password changes enforced by one process are "
+            "not noticed by the others for up to PASSWORD_CHECK_SECONDS.",
+            hint="Use a shared cache like Memcached or Redis, or set "
+            "PASSWORD_CHECK_SECONDS to 0 to check on every request.",
+            id="password_policies.W001",
+        )
+    ]
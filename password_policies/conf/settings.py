@@ -18,6 +18,14 @@ PASSWORD_CHANGE_REQUIRED_ADMIN_SEARCH_FIELDS = getattr(
 )
 
 
+#: The alias of the cache (as defined in the ``CACHES`` setting) used
+#: to notify other processes about changes of a user's password state,
+#: e.g. forced password changes.
+#:
+#: Use a cache shared by all processes, a local memory cache is only
+#: seen by the process that wrote to it.
+PASSWORD_CACHE_ALIAS = getattr(settings, "PASSWORD_CACHE_ALIAS", "default")
+
 #: Determines wether the :middleware:`PasswordChangeMiddleware`
 #: should ignore the logout views, allowing the user to log out
 #: even if a password change is required.
@@ -31,9 +39,18 @@ PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS = getattr(
 )
 #: Determines after how many seconds a check shall
 #: be performed if the user's password has expired.
+#: Until then the :middleware:`PasswordChangeMiddleware` reuses
+#: the result of the last check stored in the session, without
+#: querying the database. Enforced password changes are applied
+#: immediately nonetheless.
+#:
+#: Enforced password changes are announced to other processes using
+#: the cache configured by
+#: :py:attr:`~password_policies.conf.Settings.PASSWORD_CACHE_ALIAS`,
+#: which must be shared by all processes when an interval is set.
 #:
-#: Defaults to 1 hour.
-PASSWORD_CHECK_SECONDS = getattr(settings, "PASSWORD_CHECK_SECONDS", 60 ** 2)
+#: Defaults to 0, performing the check on every request.
+PASSWORD_CHECK_SECONDS = getattr(settings, "PASSWORD_CHECK_SECONDS", 0)
 
 #: Specifies a list of common sequences to attempt to
 #: match a password against.
@@ -59,6 +76,14 @@ word per line). Could be "/usr/share/dict/words".
 
 Used by the :validator:`DictionaryValidator`.
 """
+#: Determines wether to read and index the dictionary files of the
+#: :validator:`DictionaryValidator` when the application is loaded instead
+#: of when a password is validated for the first time.
+#:
+#: Loading the dictionaries before a preforking server (e.g. gunicorn
+#: using ``--preload``) forks its workers lets the workers share the
+#: memory of the index copy-on-write.
+PASSWORD_DICTIONARY_PRELOAD = getattr(settings, "PASSWORD_DICTIONARY_PRELOAD", False)
 #: A minimum distance of the difference between old and
 #: new password. A positive integer. Values greater
 #: than 1 are recommended.
@@ -96,6 +121,39 @@ PASSWORD_HISTORY_ADMIN_SEARCH_FIELDS = getattr(
 #:
 #: Defaults to 10 entries.
 PASSWORD_HISTORY_COUNT = getattr(settings, "PASSWORD_HISTORY_COUNT", 10)
+#: Specifies the number of threads used to verify a password against
+#: the user's password history concurrently. The threads are shared by
+#: all requests of a process.
+#:
+#: A single thread could not verify entries concurrently, so values of
+#: ``1`` or less verify one entry after another in the calling thread.
+#:
+#: Defaults to ``0``, verifying one entry after another.
+PASSWORD_HISTORY_CHECK_WORKERS = getattr(settings, "PASSWORD_HISTORY_CHECK_WORKERS", 0)
+#: The algorithm of the password hasher used to encode password history
+#: entries, e.g. ``"argon2"``. The hasher must be listed in Django's
+#: ``PASSWORD_HASHERS`` setting.
+#:
+#: Entries encoded using another hasher or outdated parameters are
+#: encoded again when a password matches them.
+#:
+#: .. warning::
+#:     The newest entry holds the user's current password, so the hasher
+#:     must be at least as strong as the one used for logins. A weaker
+#:     hasher weakens the protection of the current passwords at rest.
+#:     Hashers without salt or key stretching (e.g. ``"md5"``) are refused.
+#:
+#: Defaults to ``None``, using Django's default password hasher.
+PASSWORD_HISTORY_HASHER = getattr(settings, "PASSWORD_HISTORY_HASHER", None)
+#: Determines wether to record a password history entry whenever a user
+#: with a new password is saved, e.g. by the ``changepassword`` management
+#: command or a project's own views, instead of only by the forms of this
+#: application.
+#:
+#: Defaults to ``False``.
+PASSWORD_HISTORY_RECORD_ON_SAVE = getattr(
+    settings, "PASSWORD_HISTORY_RECORD_ON_SAVE", False
+)
 #: Specifies how close a fuzzy match has to be,
 #: considered a match.
 #:
@@ -154,6 +212,19 @@ PASSWORD_MIN_SYMBOLS = getattr(settings, "PASSWORD_MIN_SYMBOLS", 1)
 PASSWORD_USE_CRACKLIB = getattr(settings, "PASSWORD_USE_CRACKLIB", False)
 #: Determines wether to use the password history.
 PASSWORD_USE_HISTORY = getattr(settings, "PASSWORD_USE_HISTORY", True)
+#: Determines wether to read the date of the last password change
+#: from the user's :class:`~password_policies.models.PasswordProfile`
+#: (a single row per user) instead of the newest entry of the password
+#: history. Works regardless of
+#: :py:attr:`~password_policies.conf.Settings.PASSWORD_USE_HISTORY`.
+PASSWORD_USE_PROFILE = getattr(settings, "PASSWORD_USE_PROFILE", False)
+#: Determines wether to cache the password status of users in the cache
+#: defined by :py:attr:`~password_policies.conf.Settings.PASSWORD_CACHE_ALIAS`.
+#:
+#: Cached entries are invalidated whenever a password history entry,
+#: an enforced password change or a password profile of a user is
+#: saved or deleted.
+PASSWORD_USE_STATUS_CACHE = getattr(settings, "PASSWORD_USE_STATUS_CACHE", False)
 #: A list of project specific words to check a password
 #: against.
 #:
@@ -189,3 +260,4 @@ PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY = "_password_policies_last_checked"
 PASSWORD_POLICIES_EXPIRED_SESSION_KEY = "_password_policies_expired"
 PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY = "_password_policies_last_changed"
 PASSWORD_POLICIES_CHANGE_REQUIRED_SESSION_KEY = "_password_policies_change_required"
+PASSWORD_POLICIES_STATUS_VERSION_SESSION_KEY = "_password_policies_status_version"
@@ -1,5 +1,5 @@
 from password_policies.conf import settings
-from password_policies.models import PasswordHistory
+from password_policies.utils import get_password_status
 
 
 def password_status(request):
@@ -31,7 +31,8 @@ in a project's settings file::
 
     if auth:
         if settings.PASSWORD_POLICIES_CHANGE_REQUIRED_SESSION_KEY not in request.session:
-            r = PasswordHistory.objects.change_required(request.user)
+            status = get_password_status(request.user)
+            r = status.change_required or status.is_expired()
         else:
             r = request.session[settings.PASSWORD_POLICIES_CHANGE_REQUIRED_SESSION_KEY]
         d['password_change_required'] = r
@@ -2,7 +2,7 @@ from __future__ import unicode_literals
 
 from django import forms
 from django.contrib.auth import get_user_model, password_validation
-from django.contrib.auth.hashers import is_password_usable, make_password
+from django.contrib.auth.hashers import is_password_usable
 from django.core import signing
 from django.core.exceptions import ObjectDoesNotExist
 from django.template import loader
@@ -31,6 +31,7 @@ except ImportError:
 
 from password_policies.conf import settings
 from password_policies.forms.fields import PasswordPoliciesField
+from password_policies.hashers import PasswordVerificationContext
 from password_policies.models import PasswordChangeRequired, PasswordHistory
 
 
@@ -63,6 +64,8 @@ class PasswordPoliciesForm(forms.Form):
 
         :arg user: A :class:`~django.contrib.auth.models.User` instance."""
         self.user = user
+        #: Memoizes password hashes while validating and saving the form.
+        self.verification_context = PasswordVerificationContext()
         super(PasswordPoliciesForm, self).__init__(*args, **kwargs)
 
     def clean_new_password1(self):
@@ -70,9 +73,12 @@ class PasswordPoliciesForm(forms.Form):
         Validates that a given password was not used before."""
         new_password1 = self.cleaned_data.get("new_password1")
         if settings.PASSWORD_USE_HISTORY:
-            if self.user.check_password(new_password1):
+            context = self.verification_context
+            if context.check_password(self.user, new_password1):
                 raise forms.ValidationError(self.error_messages["password_used"])
-            if not PasswordHistory.objects.check_password(self.user, new_password1):
+            if not PasswordHistory.objects.check_password(
+                self.user, new_password1, context=context
+            ):
                 raise forms.ValidationError(self.error_messages["password_used"])
         return new_password1
 
@@ -94,13 +100,11 @@ class PasswordPoliciesForm(forms.Form):
         if :py:attr:`~password_policies.conf.Settings.PASSWORD_USE_HISTORY`
         is set to ``True``."""
         new_password = self.cleaned_data["new_password1"]
-        self.user.set_password(new_password)
+        self.verification_context.set_password(self.user, new_password)
         if commit:
             self.user.save()
-            if settings.PASSWORD_USE_HISTORY:
-                password = make_password(new_password)
-                PasswordHistory.objects.create(password=password, user=self.user)
-                PasswordHistory.objects.delete_expired(self.user)
+            if settings.PASSWORD_USE_HISTORY and not settings.PASSWORD_HISTORY_RECORD_ON_SAVE:
+                PasswordHistory.objects.record(self.user, new_password)
             PasswordChangeRequired.objects.filter(user=self.user).delete()
         return self.user
 
@@ -129,7 +133,7 @@ class PasswordPoliciesChangeForm(PasswordPoliciesForm):
         """
         Validates the current password."""
         old_password = self.cleaned_data["old_password"]
-        if not self.user.check_password(old_password):
+        if not self.verification_context.check_password(self.user, old_password):
             raise forms.ValidationError(self.error_messages["password_incorrect"])
         return old_password
 
@@ -8,6 +8,7 @@ except ImportError:
 
 from password_policies.conf import settings
 from password_policies.forms.fields import PasswordPoliciesField
+from password_policies.hashers import PasswordVerificationContext
 from password_policies.models import PasswordHistory
 from password_policies.models import PasswordChangeRequired
 
@@ -27,29 +28,45 @@ Use this form to enforce strong passwords in the admin interface.
                                       min_length=settings.PASSWORD_MIN_LENGTH
                                       )
 
+    def __init__(self, user, *args, **kwargs):
+        #: Memoizes password hashes while validating and saving the form.
+        self.verification_context = PasswordVerificationContext()
+        super(PasswordPoliciesAdminForm, self).__init__(user, *args, **kwargs)
+
     def clean_password1(self):
         """
 Validates that a given password was not used before.
 """
         password1 = self.cleaned_data.get('password1')
         if settings.PASSWORD_USE_HISTORY:
-            if self.user.check_password(password1):
+            context = self.verification_context
+            if context.check_password(self.user, password1):
                 raise forms.ValidationError(
                     self.error_messages['password_used'])
             if not PasswordHistory.objects.check_password(self.user,
-                                                          password1):
+                                                          password1,
+                                                          context=context):
                 raise forms.ValidationError(
                     self.error_messages['password_used'])
         return password1
 
+    def save(self, commit=True):
+        """
+Saves the new password and records it in the user's password history.
+"""
+        user = super(PasswordPoliciesAdminForm, self).save(commit=commit)
+        if commit and settings.PASSWORD_USE_HISTORY and not settings.PASSWORD_HISTORY_RECORD_ON_SAVE:
+            PasswordHistory.objects.record(user, self.cleaned_data.get("password1"))
+        return user
+
 
 class ForceChangeAdminForm(PasswordPoliciesAdminForm):
     change_required = forms.BooleanField(initial=True, required=False, label=_('Must change?'))
 
     def save(self, commit=True):
         user = super(ForceChangeAdminForm, self).save(commit=commit)
-        if self.cleaned_data["change_required"] and not PasswordChangeRequired.objects.filter(user=user).count():
-            PasswordChangeRequired.objects.create(user=user)
+        if self.cleaned_data["change_required"]:
+            PasswordChangeRequired.objects.enforce(user)
         return user
 
 
@@ -57,6 +74,5 @@ class ForceChangeRequiredAdminForm(PasswordPoliciesAdminForm):
 
     def save(self, commit=True):
         user = super(ForceChangeRequiredAdminForm, self).save(commit=commit)
-        if not PasswordChangeRequired.objects.filter(user=user).count():
-            PasswordChangeRequired.objects.create(user=user)
+        PasswordChangeRequired.objects.enforce(user)
         return user
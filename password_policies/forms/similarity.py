@@ -0,0 +1,419 @@
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import defaultdict
+from collections.abc import Sequence
+
+try:
+    from django.utils.encoding import smart_str as smart_text
+except ImportError:
+    # Before in Django 2.0
+    from django.utils.encoding import smart_text
+
+_dictionaries = {}
+_dictionaries_lock = threading.Lock()
+
+#: Identifies compiled dictionary files.
+COMPILED_MAGIC = b"PPDICT01"
+# Magic, byte order mark, q and the number of words, buckets, q-grams
+# and postings, followed by these arrays of unsigned 32 bit integers:
+# buckets (length, first, last word), word offsets, q-gram offsets,
+# posting offsets and postings, followed by the UTF-8 encoded words and
+# q-grams.
+_header = struct.Struct("=8s6I")
+_BYTE_ORDER_MARK = 0x01020304
+
+
+def substring_distance(needle, haystack, max_distance=None):
+    """
+    Returns the smallest edit distance between a needle and any substring
+    of a haystack.
+
+    Uses the bit-parallel algorithm of Myers, as formulated by Hyyrö, with
+    Python integers as bit vectors: each character of the haystack is
+    processed with a few integer operations instead of a row of the
+    dynamic programming matrix.
+
+    If ``max_distance`` is given the computation stops as soon as the
+    distance can not be ``max_distance`` or less anymore. In that case the
+    returned value is greater than ``max_distance``, but not necessarily
+    the exact distance.
+
+    :arg str needle: A unicode string.
+    :arg str haystack: A unicode string.
+    :arg int max_distance: The largest distance of interest.
+    :returns: The distance.
+    :rtype: int"""
+    m, n = len(needle), len(haystack)
+    if not m:
+        return 0
+    if max_distance is not None and m - n > max_distance:
+        # At least m - n characters of the needle have to be deleted.
+        return m - n
+    peq = {}
+    for i, char in enumerate(needle):
+        peq[char] = peq.get(char, 0) | 1 << i
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv = mask, 0
+    best = score = m
+    for j, char in enumerate(haystack):
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+            if score < best:
+                best = score
+                if not best:
+                    break
+        if max_distance is not None and best > max_distance:
+            # The distance decreases by one per character at most.
+            if score - (n - 1 - j) > max_distance:
+                break
+        # Substrings may start anywhere, so the first row stays zero.
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return best
+
+
+def get_max_distance(longest, length, threshold):
+    """
+    Returns the largest distance which still results in a similarity of at
+    least ``threshold``, as computed by
+    :class:`~password_policies.forms.validators.BaseSimilarityValidator`.
+
+    :arg int longest: The length of the longer of both strings.
+    :arg int length: The largest possible distance.
+    :arg float threshold: The minimum similarity.
+    :returns: The distance, ``-1`` if no distance is similar enough.
+    :rtype: int"""
+    distance = -1
+    # Use the very same expression as the validator, so rounding
+    # errors can not make both disagree.
+    while distance < length and (longest - distance - 1) / longest >= threshold:
+        distance += 1
+    return distance
+
+
+class QGramIndex(object):
+    """
+    An inverted index of the q-grams (substrings of length ``q``) of a list
+    of words, used to find the words a password may be similar to without
+    comparing it to every single word.
+
+    The filter is based on the q-gram lemma: if a needle of length ``m``
+    matches a substring of a word with at most ``k`` edits, at least
+    ``m - q + 1 - k * q`` of the needle's q-grams occur in the word. The
+    words are grouped by length, so the number of edits allowed to reach the
+    similarity threshold is known for each group. Words too short to
+    contain a close enough substring are skipped as well.
+
+    Words are compared in lower case, just like
+    :meth:`~password_policies.forms.validators.BaseSimilarityValidator.fuzzy_substring`.
+
+    :arg words: A list of unicode strings.
+    :arg int q: The length of the q-grams."""
+
+    def __init__(self, words, q=3):
+        self.q = q
+        self.words = list(words)
+        lowered = [word.lower() for word in self.words]
+        #: The lengths of the words.
+        self.sizes = [len(word) for word in self.words]
+        #: The lengths of the lowercased words.
+        self.lengths = [len(word) for word in lowered]
+        self.buckets = defaultdict(list)
+        self.postings = defaultdict(list)
+        for i, word in enumerate(lowered):
+            self.buckets[self.sizes[i]].append(i)
+            for gram in set(self.get_qgrams(word)):
+                self.postings[gram].append(i)
+
+    def get_postings(self, gram):
+        "Returns the indexes of the words containing a q-gram."
+        return self.postings.get(gram, ())
+
+    def get_qgrams(self, value):
+        "Returns the q-grams of a string in order, including duplicates."
+        return [value[i:i + self.q] for i in range(len(value) - self.q + 1)]
+
+    def get_candidates(self, needle, threshold):
+        """
+        Returns the words which may be at least ``threshold`` similar to a
+        needle. Words which are not returned are guaranteed to be less
+        similar.
+
+        :arg str needle: A unicode string.
+        :arg float threshold: The minimum similarity.
+        :returns: A sequence of words in their original order.
+        :rtype: list"""
+        lowered = needle.lower()
+        length = len(lowered)
+        if length <= 1:
+            # Special cased by fuzzy_substring(), compare all words.
+            return self.words
+        windows = length - self.q + 1
+        candidates = []
+        # The number of q-grams a word must share per word length.
+        required = {}
+        for size, indexes in self.buckets.items():
+            if not size:
+                candidates.extend(indexes)
+                continue
+            distance = get_max_distance(max(len(needle), size), length, threshold)
+            if distance < 0:
+                continue
+            if windows - distance * self.q > 0:
+                required[size] = (windows - distance * self.q, distance)
+                continue
+            candidates.extend(
+                i for i in indexes if length - self.lengths[i] <= distance
+            )
+        if required:
+            counts = defaultdict(int)
+            grams = defaultdict(int)
+            for gram in self.get_qgrams(lowered):
+                grams[gram] += 1
+            for gram, count in grams.items():
+                for i in self.get_postings(gram):
+                    counts[i] += count
+            for i, count in counts.items():
+                minimum = required.get(self.sizes[i])
+                if minimum is None or count < minimum[0]:
+                    continue
+                if length - self.lengths[i] <= minimum[1]:
+                    candidates.append(i)
+        candidates.sort()
+        return [self.words[i] for i in candidates]
+
+
+class CompiledWords(Sequence):
+    """
+    The words of a :class:`CompiledIndex`, decoded when accessed.
+
+    :arg data: A buffer holding the UTF-8 encoded words.
+    :arg offsets: The start offsets of the words and the end offset.
+    :arg extra: A list of unicode strings following the compiled words."""
+
+    def __init__(self, data, offsets, extra=()):
+        self.data = data
+        self.offsets = offsets
+        self.count = len(offsets) - 1
+        self.extra = list(extra)
+
+    def __len__(self):
+        return self.count + len(self.extra)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i >= self.count:
+            return self.extra[i - self.count]
+        return str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class CompiledIndex(QGramIndex):
+    """
+    A :class:`QGramIndex` of a dictionary file compiled by
+    :func:`write_compiled_dictionary`.
+
+    The file is memory mapped and its words are only decoded when they are
+    compared to a password, so loading it is nearly instant and all
+    processes using it share the same memory. The compiled words are
+    lowercased and sorted by length.
+
+    :arg str path: The path of the compiled dictionary file.
+    :arg words: A list of additional unicode strings, indexed in memory."""
+
+    def __init__(self, path, words=()):
+        with open(path, "rb") as dictionary:
+            self.mmap = mmap.mmap(dictionary.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self.mmap)
+        magic, mark, self.q, words_count, buckets, grams, postings = (
+            _header.unpack_from(data)
+        )
+        if magic != COMPILED_MAGIC or mark != _BYTE_ORDER_MARK:
+            raise ValueError("%s is not a compiled dictionary." % path)
+        position = _header.size
+
+        def integers(count):
+            nonlocal position
+            start, position = position, position + 4 * count
+            return data[start:position].cast("I")
+
+        bucket_table = integers(3 * buckets)
+        offsets = integers(words_count + 1)
+        self.lengths = self.sizes = integers(words_count)
+        self.gram_offsets = integers(grams + 1)
+        self.posting_offsets = integers(grams + 1)
+        self.postings = integers(postings)
+        words_data = data[position:position + offsets[-1]]
+        position += offsets[-1]
+        self.grams = data[position:position + self.gram_offsets[-1]]
+        self.words = CompiledWords(words_data, offsets, words)
+        self.buckets = {
+            bucket_table[i]: range(bucket_table[i + 1], bucket_table[i + 2])
+            for i in range(0, len(bucket_table), 3)
+        }
+        #: A :class:`QGramIndex` of the additional words.
+        self.extra = QGramIndex(words, q=self.q)
+
+    def get_gram(self, i):
+        return bytes(self.grams[self.gram_offsets[i]:self.gram_offsets[i + 1]])
+
+    def get_postings(self, gram):
+        key = gram.encode("utf-8")
+        # The q-grams are sorted, look them up using a binary search.
+        low, high = 0, len(self.gram_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_gram(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self.gram_offsets) - 1 or self.get_gram(low) != key:
+            return ()
+        i = low
+        return self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]]
+
+    def get_candidates(self, needle, threshold):
+        if len(needle.lower()) <= 1:
+            return self.words
+        return super().get_candidates(needle, threshold) + list(
+            self.extra.get_candidates(needle, threshold)
+        )
+
+
+def write_compiled_dictionary(words, output, q=3):
+    """
+    Writes a list of words in the format read by :class:`CompiledIndex`.
+
+    The words are lowercased, duplicates and empty lines are dropped.
+
+    :arg words: An iterable of unicode strings.
+    :arg output: A binary file object.
+    :arg int q: The length of the q-grams.
+    :returns: The number of words written.
+    :rtype: int"""
+    unique = {}
+    for word in words:
+        word = word.lower()
+        if word:
+            unique.setdefault(word, None)
+    ordered = sorted(unique, key=len)
+
+    buckets = array("I")
+    offsets = array("I", [0])
+    lengths = array("I")
+    postings = defaultdict(list)
+    encoded = []
+    for i, word in enumerate(ordered):
+        if not buckets or buckets[-3] != len(word):
+            buckets.extend((len(word), i, i))
+        buckets[-1] = i + 1
+        data = word.encode("utf-8")
+        encoded.append(data)
+        offsets.append(offsets[-1] + len(data))
+        lengths.append(len(word))
+        for gram in set(word[j:j + q] for j in range(len(word) - q + 1)):
+            postings[gram.encode("utf-8")].append(i)
+
+    gram_offsets = array("I", [0])
+    posting_offsets = array("I", [0])
+    posting_list = array("I")
+    for gram in sorted(postings):
+        gram_offsets.append(gram_offsets[-1] + len(gram))
+        posting_list.extend(postings[gram])
+        posting_offsets.append(len(posting_list))
+
+    output.write(
+        _header.pack(
+            COMPILED_MAGIC,
+            _BYTE_ORDER_MARK,
+            q,
+            len(ordered),
+            len(buckets) // 3,
+            len(postings),
+            len(posting_list),
+        )
+    )
+    for integers in (
+        buckets,
+        offsets,
+        lengths,
+        gram_offsets,
+        posting_offsets,
+        posting_list,
+    ):
+        output.write(integers.tobytes())
+    output.write(b"".join(encoded))
+    output.write(b"".join(sorted(postings)))
+    return len(ordered)
+
+
+def is_compiled_dictionary(path):
+    """
+    :arg str path: The path of a dictionary file.
+    :returns: ``True`` if the file has been compiled by
+      :func:`write_compiled_dictionary`, ``False`` otherwise.
+    :rtype: bool"""
+    with open(path, "rb") as dictionary:
+        return dictionary.read(len(COMPILED_MAGIC)) == COMPILED_MAGIC
+
+
+def read_dictionary(path):
+    """
+    Reads a dictionary file with one word per line.
+
+    :arg str path: The path of the dictionary file.
+    :returns: A list of unicode strings.
+    :rtype: list"""
+    with open(path) as dictionary:
+        return [smart_text(line.strip()) for line in dictionary]
+
+
+def get_dictionary_index(path=None, words=()):
+    """
+    Returns a :class:`QGramIndex` of the words of a dictionary file and a
+    list of additional words. Compiled dictionary files are memory mapped
+    using a :class:`CompiledIndex`, plain text files are read into memory.
+
+    Indexes are shared by all callers of a process and kept until the
+    modification time of the dictionary file changes, so each dictionary
+    is read once and only when it is needed.
+
+    :arg str path: The path of the dictionary file, if any.
+    :arg words: A list of unicode strings.
+    :returns: A :class:`QGramIndex` instance.
+    :rtype: QGramIndex"""
+    mtime = os.stat(path).st_mtime_ns if path else None
+    key = (path, tuple(words))
+    entry = _dictionaries.get(key)
+    if entry is None or entry[0] != mtime:
+        with _dictionaries_lock:
+            entry = _dictionaries.get(key)
+            if entry is None or entry[0] != mtime:
+                if path and is_compiled_dictionary(path):
+                    index = CompiledIndex(path, words)
+                else:
+                    haystacks = read_dictionary(path) if path else []
+                    haystacks.extend(words)
+                    index = QGramIndex(haystacks)
+                entry = (mtime, index)
+                _dictionaries[key] = entry
+    return entry[1]
+
+
+def clear_dictionary_indexes():
+    "Drops all indexes returned by :func:`get_dictionary_index`."
+    with _dictionaries_lock:
+        _dictionaries.clear()
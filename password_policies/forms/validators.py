@@ -6,12 +6,6 @@ import unicodedata
 
 from django.core.exceptions import ValidationError
 
-try:
-    from django.utils.encoding import smart_str as smart_text
-except ImportError:
-    # Before in Django 2.0
-    from django.utils.encoding import smart_text
-
 try:
     from django.utils.encoding import force_str as force_text
 except ImportError:
@@ -26,6 +20,11 @@ except ImportError:
     from django.utils.translation import ungettext
 
 from password_policies.conf import settings
+from password_policies.forms.similarity import (
+    get_dictionary_index,
+    get_max_distance,
+    substring_distance,
+)
 
 try:
     # Python 3 does not have an xrange, this will throw a NameError
@@ -111,6 +110,8 @@ class BaseSimilarityValidator:
 
     Raises a :class:`~django.core.exceptions.ValidationError` if the similarity
     is greater than :py:attr:`~password_policies.conf.Settings.PASSWORD_MATCH_THRESHOLD`.
+    The first matching haystack is passed to the error as the ``haystacks``
+    parameter.
     """
 
     # Taken from django-passwords
@@ -124,17 +125,31 @@ class BaseSimilarityValidator:
 
     def __call__(self, value):
         needle = force_text(value)
-        for haystack in self.haystacks:
-            distance = self.fuzzy_substring(needle, haystack)
+        threshold = self.get_threshold()
+        for haystack in self.get_candidates(needle):
             longest = max(len(needle), len(haystack))
+            max_distance = get_max_distance(longest, len(needle.lower()), threshold)
+            distance = self.fuzzy_substring(needle, haystack, max_distance)
             similarity = (longest - distance) / longest
-            if similarity >= self.get_threshold():
+            if similarity >= threshold:
+                # Only report the matching haystack, the message is
+                # interpolated lazily when the error is rendered.
                 raise ValidationError(
-                    self.message % {"haystacks": ", ".join(self.haystacks)},
-                    code=self.code,
+                    self.message, code=self.code, params={"haystacks": haystack}
                 )
 
-    def fuzzy_substring(self, needle, haystack):
+    def fuzzy_substring(self, needle, haystack, max_distance=None):
+        """
+        Returns the smallest edit distance between a needle and any
+        substring of a haystack, ignoring case.
+
+        :arg str needle: A unicode string.
+        :arg str haystack: A unicode string.
+        :arg int max_distance: Stop as soon as the distance is known to be
+          greater, see :func:`~password_policies.forms.similarity.substring_distance`.
+        :returns: The distance, ``-1`` if the needle is a single character
+          not found in the haystack.
+        :rtype: int"""
         needle, haystack = needle.lower(), haystack.lower()
         m, n = len(needle), len(haystack)
 
@@ -143,15 +158,17 @@ class BaseSimilarityValidator:
                 return -1
         if not n:
             return m
+        return substring_distance(needle, haystack, max_distance)
+
+    def get_candidates(self, needle):
+        """
+        Returns the haystacks a needle is compared to. Subclasses may leave
+        out haystacks which can not be similar enough.
 
-        row1 = [0] * (n + 1)
-        for i in range(0, m):
-            row2 = [i + 1]
-            for j in range(0, n):
-                cost = needle[i] != haystack[j]
-                row2.append(min(row1[j + 1] + 1, row2[j] + 1, row1[j] + cost))
-            row1 = row2
-        return min(row1)
+        :arg str needle: A unicode string.
+        :returns: :py:attr:`~BaseSimilarityValidator.haystacks`.
+        :rtype: list"""
+        return self.haystacks
 
     def get_threshold(self):
         """
@@ -366,11 +383,14 @@ class DictionaryValidator(BaseSimilarityValidator):
         AND :py:attr:`~DictionaryValidator.words` are empty or set
         to None validation is not performed.
 
-    .. warning::
-        This validator is very time consuming and validation
-        duration depends on the amount of lines in the dictionary
-        file. The larger the dictionary file, the longer validation
-        takes!"""
+    .. note::
+        The words are read and indexed by their q-grams when the validator
+        is used for the first time, so a password is only compared to the
+        words it may be similar to. Validators using the same dictionary
+        file and words share a single index, see
+        :func:`~password_policies.forms.similarity.get_dictionary_index`.
+        Set :py:attr:`~password_policies.conf.Settings.PASSWORD_DICTIONARY_PRELOAD`
+        to build the index on startup instead."""
 
     # Taken from django-passwords
 
@@ -394,15 +414,28 @@ class DictionaryValidator(BaseSimilarityValidator):
             self.words = settings.PASSWORD_WORDS
         else:
             self.words = words
-        haystacks = []
-        if self.dictionary:
-            with open(self.dictionary) as dictionary:
-                haystacks.extend(
-                    [smart_text(x.strip()) for x in dictionary.readlines()]
-                )
-        if self.words:
-            haystacks.extend(self.words)
-        super().__init__(haystacks=haystacks)
+        super().__init__()
+
+    @property
+    def haystacks(self):
+        "The words of the dictionary file followed by the additional words."
+        return self.index.words
+
+    @property
+    def index(self):
+        """
+        A :class:`~password_policies.forms.similarity.QGramIndex` of the
+        haystacks, loaded on first access."""
+        return get_dictionary_index(self.dictionary, self.words or ())
+
+    def get_candidates(self, needle):
+        """
+        Returns the words which may be similar to a needle, using
+        :py:attr:`~DictionaryValidator.index`.
+
+        :arg str needle: A unicode string.
+        :rtype: list"""
+        return self.index.get_candidates(needle, self.get_threshold())
 
 
 class InvalidCharacterValidator(BaseRFC4013Validator):
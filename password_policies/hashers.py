@@ -0,0 +1,232 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from django.contrib.auth.hashers import (
+    check_password,
+    get_hasher,
+    identify_hasher,
+    make_password,
+)
+from django.core.exceptions import ImproperlyConfigured
+
+from password_policies.conf import settings
+
+
+@lru_cache(maxsize=None)
+def _get_executor(max_workers):
+    return ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="password_policies"
+    )
+
+
+def get_executor():
+    """
+    Returns the thread pool shared by all password history checks.
+
+    The pool is created on first use with
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_CHECK_WORKERS`
+    threads.
+
+    :returns: A :class:`~concurrent.futures.ThreadPoolExecutor` instance."""
+    return _get_executor(settings.PASSWORD_HISTORY_CHECK_WORKERS)
+
+
+def verify_password(raw_password, encoded):
+    """
+    Checks a raw password against an encoded password using the
+    hasher the encoded password has been created with.
+
+    :arg str raw_password: A unicode string representing a password.
+    :arg str encoded: An encoded password.
+    :returns: ``True`` if the passwords match, ``False`` otherwise.
+    :rtype: bool"""
+    hasher = identify_hasher(encoded)
+    return hasher.verify(raw_password, encoded)
+
+
+def find_match(raw_password, encoded_passwords):
+    """
+    Finds the encoded password matching a raw password.
+
+    If :py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_CHECK_WORKERS`
+    is set to ``2`` or more the passwords are verified concurrently on a shared thread pool.
+    Key derivation functions like PBKDF2 or Argon2 release the GIL, so the
+    checks run in parallel. As soon as a password matches, the checks not
+    started yet are cancelled; checks already running can not be
+    interrupted and finish in the background.
+
+    :arg str raw_password: A unicode string representing a password.
+    :arg encoded_passwords: An iterable of encoded passwords.
+    :returns: The matching encoded password, ``None`` if none matches.
+    :rtype: str"""
+    encoded_passwords = list(encoded_passwords)
+    if settings.PASSWORD_HISTORY_CHECK_WORKERS < 2 or len(encoded_passwords) < 2:
+        for encoded in encoded_passwords:
+            if verify_password(raw_password, encoded):
+                return encoded
+        return None
+
+    done = threading.Event()
+
+    def verify(encoded):
+        # Skip checks picked up by a worker after a match has been found.
+        if done.is_set():
+            return False
+        return verify_password(raw_password, encoded)
+
+    executor = get_executor()
+    futures = {
+        executor.submit(verify, encoded): encoded for encoded in encoded_passwords
+    }
+    try:
+        for future in as_completed(futures):
+            if future.result():
+                return futures[future]
+        return None
+    finally:
+        done.set()
+        for future in futures:
+            future.cancel()
+
+
+def verify_any(raw_password, encoded_passwords):
+    """
+    Checks if a raw password matches any of the given encoded passwords,
+    see :func:`find_match`.
+
+    :arg str raw_password: A unicode string representing a password.
+    :arg encoded_passwords: An iterable of encoded passwords.
+    :returns: ``True`` if a password matches, ``False`` otherwise.
+    :rtype: bool"""
+    return find_match(raw_password, encoded_passwords) is not None
+
+
+#: Hashers without salt or key stretching, which must not encode the
+#: password history.
+INSECURE_HASHERS = ("crypt", "md5", "sha1", "unsalted_md5", "unsalted_sha1")
+
+
+def get_history_hasher():
+    """
+    Returns the hasher used for new password history entries, as configured
+    by :py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_HASHER`.
+
+    The newest entry is the user's current password, so the hashers listed
+    in :data:`INSECURE_HASHERS` are refused.
+
+    :returns: A password hasher instance.
+    :raises ImproperlyConfigured: If the hasher is insecure."""
+    hasher = get_hasher(settings.PASSWORD_HISTORY_HASHER or "default")
+    if settings.PASSWORD_HISTORY_HASHER and hasher.algorithm in INSECURE_HASHERS:
+        raise ImproperlyConfigured(
+            "PASSWORD_HISTORY_HASHER must not be an insecure hasher like %r, "
+            "the password history contains the current passwords."
+            % hasher.algorithm
+        )
+    return hasher
+
+
+def make_history_password(raw_password):
+    """
+    Encodes a password for the password history using the hasher returned
+    by :func:`get_history_hasher`.
+
+    :arg str raw_password: A unicode string representing a password.
+    :returns: The encoded password.
+    :rtype: str"""
+    return make_password(raw_password, hasher=get_history_hasher())
+
+
+def must_update_history_password(encoded):
+    """
+    Checks if a password history entry has been encoded using another
+    hasher or other parameters than those of :func:`get_history_hasher`.
+
+    :arg str encoded: An encoded password.
+    :returns: ``True`` if the entry should be encoded again, ``False``
+      otherwise.
+    :rtype: bool"""
+    hasher = get_history_hasher()
+    if identify_hasher(encoded).algorithm != hasher.algorithm:
+        return True
+    return hasher.must_update(encoded)
+
+
+class PasswordVerificationContext(object):
+    """
+    Memoizes the results of verifying passwords.
+
+    Password hashers are slow on purpose. Validating and saving a password
+    change form hashes the same password several times, e.g. to check the
+    user's current password, the password history and to store the new
+    password. Sharing a context between these steps runs each hasher at
+    most once per distinct password and encoded password.
+
+    A context keeps raw passwords in memory, so it should only live as long
+    as a form or a request."""
+
+    def __init__(self):
+        self.results = {}
+
+    def check_password(self, user, raw_password):
+        """
+        Memoized version of the ``check_password`` method of a user.
+
+        :arg user: A :class:`~django.contrib.auth.models.User` instance.
+        :arg str raw_password: A unicode string representing a password.
+        :returns: ``True`` if the password is the user's password,
+          ``False`` otherwise.
+        :rtype: bool"""
+        key = (user.password, raw_password)
+        if key not in self.results:
+            self.results[key] = user.check_password(raw_password)
+            # The user's hash may have been upgraded while checking.
+            self.results[(user.password, raw_password)] = self.results[key]
+        return self.results[key]
+
+    def check_encoded_password(self, raw_password, encoded):
+        """
+        Memoized version of :func:`~django.contrib.auth.hashers.check_password`.
+
+        Unlike :meth:`check_password` the hash is not upgraded if the
+        hasher's settings have changed, so the database is not accessed.
+
+        :arg str raw_password: A unicode string representing a password.
+        :arg str encoded: An encoded password.
+        :returns: ``True`` if the passwords match, ``False`` otherwise.
+        :rtype: bool"""
+        key = (encoded, raw_password)
+        if key not in self.results:
+            self.results[key] = check_password(raw_password, encoded)
+        return self.results[key]
+
+    def set_password(self, user, raw_password):
+        """
+        Sets the password of a user and remembers that the raw password
+        matches the new encoded password.
+
+        :arg user: A :class:`~django.contrib.auth.models.User` instance.
+        :arg str raw_password: A unicode string representing a password."""
+        user.set_password(raw_password)
+        self.results[(user.password, raw_password)] = True
+
+    def find_match(self, raw_password, encoded_passwords):
+        """
+        Memoized version of :func:`find_match`.
+
+        Only the encoded passwords not verified before are checked."""
+        pending = []
+        for encoded in encoded_passwords:
+            result = self.results.get((encoded, raw_password))
+            if result:
+                return encoded
+            if result is None:
+                pending.append(encoded)
+        match = find_match(raw_password, pending)
+        if match is not None:
+            self.results[(match, raw_password)] = True
+            return match
+        for encoded in pending:
+            self.results[(encoded, raw_password)] = False
+        return None
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from password_policies.conf import settings
+from password_policies.forms.similarity import (
+    is_compiled_dictionary,
+    read_dictionary,
+    write_compiled_dictionary,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compiles a dictionary file with one word per line into a binary "
+        "file which the DictionaryValidator memory maps instead of reading "
+        "it into memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "dictionary",
+            nargs="?",
+            default=settings.PASSWORD_DICTIONARY,
+            help="The dictionary file to compile (default: PASSWORD_DICTIONARY).",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="The compiled file to write (default: the dictionary file "
+            "name followed by .compiled). Point PASSWORD_DICTIONARY to it.",
+        )
+
+    def handle(self, *args, **options):
+        source = options["dictionary"]
+        if not source:
+            raise CommandError("No dictionary given and PASSWORD_DICTIONARY is not set.")
+        if not os.path.isfile(source):
+            raise CommandError("Dictionary %s does not exist." % source)
+        if is_compiled_dictionary(source):
+            raise CommandError("Dictionary %s is already compiled." % source)
+        output = options["output"] or "%s.compiled" % source
+
+        started = time.monotonic()
+        words = read_dictionary(source)
+        # Write to a temporary file first, processes still mapping a
+        # previous version of the output keep using it until reloaded.
+        directory = os.path.dirname(os.path.abspath(output))
+        fd, path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as compiled:
+                count = write_compiled_dictionary(words, compiled)
+            os.chmod(path, 0o644)
+            os.replace(path, output)
+        except BaseException:
+            os.remove(path)
+            raise
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Compiled %d of %d words into %s (%d bytes) in %.1fs."
+                % (
+                    count,
+                    len(words),
+                    output,
+                    os.path.getsize(output),
+                    time.monotonic() - started,
+                )
+            )
+        )
@@ -0,0 +1,130 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from password_policies.conf import settings
+from password_policies.models import PasswordHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes password history entries exceeding PASSWORD_HISTORY_COUNT "
+        "for all users, e.g. after lowering the setting."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of users processed per chunk (default: 1000).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Maximum number of entries deleted per statement and "
+            "transaction (default: 10000).",
+        )
+        parser.add_argument(
+            "--offset",
+            type=int,
+            default=settings.PASSWORD_HISTORY_COUNT,
+            help="Number of entries to keep per user "
+            "(default: PASSWORD_HISTORY_COUNT).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait between two transactions to reduce the "
+            "load of the database (default: 0).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the entries which would be deleted.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to use (default: %s)." % DEFAULT_DB_ALIAS,
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        offset = options["offset"]
+        batch_size = options["batch_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be a positive number.")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive number.")
+        if offset < 1:
+            raise CommandError("--offset must be a positive number.")
+        database = options["database"]
+        dry_run = options["dry_run"]
+        manager = PasswordHistory.objects.db_manager(database)
+        users = (
+            get_user_model()
+            ._default_manager.using(database)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+        started = time.monotonic()
+        last_pk = None
+        processed = deleted = 0
+        while True:
+            qs = users if last_pk is None else users.filter(pk__gt=last_pk)
+            chunk = list(qs[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1]
+            if dry_run:
+                deleted += manager.get_expired(chunk, offset=offset).count()
+            else:
+                deleted += self.delete_expired(
+                    manager, chunk, offset, batch_size, options["sleep"]
+                )
+            processed += len(chunk)
+            if options["verbosity"] >= 1:
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    "Processed %d users, %s %d entries (%.1f entries/s)"
+                    % (
+                        processed,
+                        "found" if dry_run else "deleted",
+                        deleted,
+                        deleted / elapsed if elapsed else 0,
+                    )
+                )
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        elapsed = time.monotonic() - started
+        if dry_run:
+            message = "Found %d expired entries of %d users in %.1fs."
+        else:
+            message = "Deleted %d expired entries of %d users in %.1fs."
+        self.stdout.write(self.style.SUCCESS(message % (deleted, processed, elapsed)))
+
+    def delete_expired(self, manager, users, offset, batch_size, sleep):
+        """
+        Deletes the expired entries of a chunk of users, at most
+        ``batch_size`` entries per transaction.
+
+        :returns: The number of deleted entries.
+        :rtype: int"""
+        deleted = 0
+        while True:
+            with transaction.atomic(using=manager.db):
+                count = manager.delete_expired_many(
+                    users, offset=offset, limit=batch_size
+                )
+            deleted += count
+            if count < batch_size:
+                return deleted
+            if sleep:
+                time.sleep(sleep)
@@ -1,74 +1,426 @@
+import asyncio
+from collections import namedtuple
 from datetime import timedelta
 
-from django.db import models
+from django.contrib.auth.hashers import is_password_usable
+from django.db import connections, models, router
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
 from django.utils import timezone
-from django.contrib.auth.hashers import identify_hasher
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ObjectDoesNotExist
 
 from password_policies.conf import settings
+from password_policies.hashers import (
+    PasswordVerificationContext,
+    make_history_password,
+    must_update_history_password,
+)
+
+
+class PasswordStatus(
+    namedtuple("PasswordStatus", ["change_required", "last_changed", "expires_at"])
+):
+    """
+    The password status of a user.
+
+    :arg bool change_required: ``True`` if a password change is enforced.
+    :arg last_changed: The date and time the password was last changed.
+    :arg expires_at: The date and time the password expires."""
+
+    __slots__ = ()
+
+    def is_expired(self, now=None):
+        """
+        Checks if the password has expired.
+
+        :arg now: The date and time to check against. Defaults to now.
+        :returns: ``True`` if the password has expired, ``False`` otherwise.
+        :rtype: bool"""
+        if now is None:
+            now = timezone.now()
+        return self.expires_at < now
+
+
+class PasswordChangeRequiredManager(models.Manager):
+    def enforce(self, user):
+        """
+Enforces a password change of a user.
+
+Nothing happens if a password change is enforced already. The entry is
+created using a single statement ignoring conflicts, so concurrent calls
+for the same user do not fail.
+
+:arg object user: A :class:`~django.contrib.auth.models.User` instance.
+"""
+        self.enforce_many([user])
+
+    def enforce_many(self, users):
+        """
+Enforces password changes of multiple users using a single statement.
+
+:arg users: An iterable of :class:`~django.contrib.auth.models.User`
+  instances.
+"""
+        from password_policies.cache import bump_status_version, uses_status_version
+
+        users = list(users)
+        # bulk_create() does not send post_save signals.
+        self.bulk_create([self.model(user=user) for user in users], ignore_conflicts=True)
+        if not uses_status_version():
+            return
+        for user in users:
+            bump_status_version(user.pk)
+
+    async def aenforce(self, user):
+        "Asynchronous version of :meth:`enforce`."
+        from password_policies.cache import abump_status_version
+
+        await self.abulk_create([self.model(user=user)], ignore_conflicts=True)
+        await abump_status_version(user.pk)
 
 
 class PasswordHistoryManager(models.Manager):
     default_offset = settings.PASSWORD_HISTORY_COUNT
+    status_fields = ("newest_password", "password_enforced")
 
     def delete_expired(self, user, offset=None):
         """
 Deletes expired password history entries from the database(s).
 
+See :meth:`delete_expired_many`.
+
 :arg user: A :class:`~django.contrib.auth.models.User` instance.
 :arg int offset: A number specifying how much entries are to be kept
   in the user's password history. Defaults
   to :py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_COUNT`.
+:returns: The number of deleted entries.
+:rtype: int
+"""
+        return self.delete_expired_many([user], offset=offset)
+
+    async def adelete_expired(self, user, offset=None):
+        """
+Asynchronous version of :meth:`delete_expired`.
+"""
+        # asgiref is not installed before Django 3.0, which has no
+        # asynchronous ORM either.
+        from asgiref.sync import sync_to_async
+
+        return await sync_to_async(self.delete_expired)(user, offset=offset)
+
+    def delete_expired_many(self, users=None, offset=None, limit=None):
+        """
+Deletes expired password history entries of multiple users using a single
+statement, see :meth:`get_expired`.
+
+:arg users: An iterable of :class:`~django.contrib.auth.models.User`
+  instances or primary keys, or a queryset of users. Defaults to all users.
+:arg int offset: A number specifying how much entries are to be kept
+  in each user's password history. Defaults
+  to :py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_COUNT`.
+:arg int limit: The maximum number of entries to delete. Defaults to all
+  expired entries.
+:returns: The number of deleted entries.
+:rtype: int
+"""
+        db = self._db or router.db_for_write(self.model)
+        connection = connections[db]
+        expired = self.get_expired(users, offset=offset).using(db)
+        expired = expired.order_by().values("pk")
+        if limit:
+            expired = expired[:limit]
+        try:
+            sql, params = expired.query.get_compiler(using=db).as_sql()
+        except EmptyResultSet:
+            # No users given, e.g. an empty list or queryset.
+            return 0
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        # The entries are deleted without fetching them and without
+        # post_delete signals: the newest entries are kept, so the password
+        # status of the users does not change. The subquery is wrapped in a
+        # derived table, as MySQL can not delete from a table it selects
+        # from in the same statement, nor limit an IN subquery.
+        sql = "DELETE FROM %s WHERE %s IN (SELECT * FROM (%s) %s)" % (
+            qn(opts.db_table),
+            qn(opts.pk.column),
+            sql,
+            qn("expired"),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def get_expired(self, users=None, offset=None):
+        """
+Gets the expired password history entries of multiple users.
+
+An entry has expired if at least ``offset`` newer entries of the same user
+exist. Entries created at the same time are ordered by their primary key.
+
+:arg users: An iterable of :class:`~django.contrib.auth.models.User`
+  instances or primary keys, or a queryset of users. Defaults to all users.
+:arg int offset: A number specifying how much entries are to be kept
+  in each user's password history. Defaults
+  to :py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_COUNT`.
+:returns: A queryset of :class:`~password_policies.models.PasswordHistory`
+  instances.
 """
         if not offset:
             offset = self.default_offset
-        qs = self.filter(user=user)
-        if qs.count() > offset:
-            entry = qs[offset:offset + 1].get()
-            qs.filter(created__lte=entry.created).delete()
+        newer = (
+            self.filter(user=OuterRef("user"))
+            .filter(
+                Q(created__gt=OuterRef("created"))
+                | Q(created=OuterRef("created"), pk__gt=OuterRef("pk"))
+            )
+            .order_by()
+            .values("user")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        qs = self.all()
+        if users is not None:
+            qs = qs.filter(user__in=users)
+        return qs.annotate(newer_entries=Subquery(newer)).filter(
+            newer_entries__gte=offset
+        )
 
     def change_required(self, user):
         """
-Checks if the user needs to change his/her password.
+Checks if the user needs to change his/her password, because it has
+expired or a password change is enforced.
 
 :arg object user: A :class:`~django.contrib.auth.models.User` instance.
 :returns: ``True`` if the user needs to change his/her password,
     ``False`` otherwise.
 :rtype: bool
 """
-        newest = self.get_newest(user)
-        if newest:
-            last_change = newest.created
-        else:
-            # TODO: Do not rely on this property!
-            last_change = user.date_joined
-        d = timedelta(seconds=settings.PASSWORD_DURATION_SECONDS)
-        expiry = timezone.now() - d
-        if last_change < expiry:
-            return True
-        return False
+        status = self.get_status(user)
+        return status.change_required or status.is_expired()
 
-    def check_password(self, user, raw_password):
+    async def achange_required(self, user):
+        """
+Asynchronous version of :meth:`change_required`.
+"""
+        status = await self.aget_status(user)
+        return status.change_required or status.is_expired()
+
+    def check_password(self, user, raw_password, context=None):
         """
 Compares a raw (UNENCRYPTED!!!) password to entries in the users's
 password history.
 
+The entries are verified concurrently if
+:py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_CHECK_WORKERS`
+is set, see :func:`~password_policies.hashers.find_match`. A matching entry
+encoded with another hasher or other parameters than configured by
+:py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_HASHER` is
+encoded again.
+
 :arg object user: A :class:`~django.contrib.auth.models.User` instance.
 :arg str raw_password: A unicode string representing a password.
+:arg context: A :class:`~password_policies.hashers.PasswordVerificationContext`
+  instance to reuse the results of previous checks. Optional.
 :returns: ``False`` if a password has been used before, ``True`` if not.
 :rtype: bool
 """
-        result = True
-        if user.check_password(raw_password):
-            result = False
+        if context is None:
+            context = PasswordVerificationContext()
+        if context.check_password(user, raw_password):
+            return False
+        entries = self.filter(user=user).values_list("password", flat=True)
+        match = context.find_match(raw_password, entries[:self.default_offset])
+        if match is None:
+            return True
+        if must_update_history_password(match):
+            password = make_history_password(raw_password)
+            self.filter(user=user, password=match).update(password=password)
+        return False
+
+    async def acheck_password(self, user, raw_password, context=None):
+        """
+Asynchronous version of :meth:`check_password`.
+
+The passwords are verified in a thread of the event loop's default
+executor, so the event loop is not blocked by the password hashers. Unlike
+:meth:`check_password` the hash of the user's current password is not
+upgraded if the hasher's settings have changed.
+"""
+        if context is None:
+            context = PasswordVerificationContext()
+        entries = self.filter(user=user).values_list("password", flat=True)
+        encoded_passwords = [
+            password async for password in entries[:self.default_offset]
+        ]
+        current = getattr(user, settings.PASSWORD_MODEL_FIELD)
+
+        def check():
+            if context.check_encoded_password(raw_password, current):
+                return True, None, None
+            match = context.find_match(raw_password, encoded_passwords)
+            if match is None or not must_update_history_password(match):
+                return match is not None, None, None
+            return True, match, make_history_password(raw_password)
+
+        loop = asyncio.get_running_loop()
+        used, match, password = await loop.run_in_executor(None, check)
+        if password is not None:
+            await self.filter(user=user, password=match).aupdate(password=password)
+        return not used
+
+    def record(self, user, raw_password=None):
+        """
+Records the current password of a user in the user's password history and
+deletes expired entries.
+
+The password hash of the user is stored as is if it has been encoded as
+configured by
+:py:attr:`~password_policies.conf.Settings.PASSWORD_HISTORY_HASHER`, so call
+this method after setting a new password instead of hashing the password
+again. Otherwise the password is encoded again if given.
+
+:arg object user: A :class:`~django.contrib.auth.models.User` instance.
+:arg str raw_password: The user's current password. Optional.
+:returns: The created :class:`~password_policies.models.PasswordHistory`
+  instance, ``None`` if the user has no usable password.
+"""
+        password = getattr(user, settings.PASSWORD_MODEL_FIELD)
+        if not password or not is_password_usable(password):
+            return None
+        if raw_password is not None and must_update_history_password(password):
+            password = make_history_password(raw_password)
+        entry = self.create(password=password, user=user)
+        self.delete_expired(user)
+        return entry
+
+    def get_status(self, user):
+        """
+Gets the password status of a user using a single query.
+
+The date of the last password change is read from the newest password
+history entry or, if
+:py:attr:`~password_policies.conf.Settings.PASSWORD_USE_PROFILE` is set
+to ``True``, from the user's password profile. If neither exists it is
+assumed that the password was last changed when the user has registered.
+
+:arg object user: A :class:`~django.contrib.auth.models.User` instance.
+:returns: A :class:`~password_policies.managers.PasswordStatus` instance.
+"""
+        qs = self._get_status_queryset(pk=user.pk)
+        return self._make_status(user, qs.values_list(*self.status_fields).first())
+
+    async def aget_status(self, user):
+        """
+Asynchronous version of :meth:`get_status`.
+
+:arg object user: A :class:`~django.contrib.auth.models.User` instance.
+:returns: A :class:`~password_policies.managers.PasswordStatus` instance.
+"""
+        qs = self._get_status_queryset(pk=user.pk)
+        return self._make_status(user, await qs.values_list(*self.status_fields).afirst())
+
+    def get_status_many(self, users, chunk_size=1000):
+        """
+Gets the password status of multiple users, using a single query for each
+``chunk_size`` users or a single query if a queryset is given.
+
+See :meth:`get_status` for how the status is determined.
+
+:arg users: An iterable of :class:`~django.contrib.auth.models.User`
+  instances or primary keys, or a queryset of users.
+:arg int chunk_size: The number of users to query at once.
+:returns: A dictionary mapping the primary keys of the users to
+  :class:`~password_policies.managers.PasswordStatus` instances. Unknown
+  users are left out, as are users without a known password change if the
+  user model has no ``date_joined`` field.
+:rtype: dict
+"""
+        if isinstance(users, models.QuerySet):
+            chunks = [users.values("pk")]
+        else:
+            pks = [getattr(user, "pk", user) for user in users]
+            chunks = [pks[i:i + chunk_size] for i in range(0, len(pks), chunk_size)]
+        user_model = self.model._meta.get_field("user").related_model
+        try:
+            user_model._meta.get_field("date_joined")
+        except FieldDoesNotExist:
+            fields = ("pk", *self.status_fields)
         else:
-            entries = self.filter(user=user).all()[:self.default_offset]
-            for entry in entries:
-                hasher = identify_hasher(entry.password)
-                if hasher.verify(raw_password, entry.password):
-                    result = False
-                    break
-        return result
+            fields = ("pk", *self.status_fields, "date_joined")
+        statuses = {}
+        for chunk in chunks:
+            qs = self._get_status_queryset(pk__in=chunk)
+            for pk, last_changed, change_required, *date_joined in qs.values_list(*fields):
+                if last_changed is None:
+                    if not date_joined:
+                        continue
+                    last_changed = date_joined[0]
+                statuses[pk] = self._make_status_from(last_changed, change_required)
+        return statuses
+
+    def change_required_many(self, users, chunk_size=1000):
+        """
+Checks if multiple users need to change their passwords, because they
+have expired or password changes are enforced, see :meth:`get_status_many`.
+
+:arg users: An iterable of :class:`~django.contrib.auth.models.User`
+  instances or primary keys, or a queryset of users.
+:arg int chunk_size: The number of users to query at once.
+:returns: A dictionary mapping the primary keys of the users to ``True``
+  if the user needs to change his/her password, ``False`` otherwise.
+:rtype: dict
+"""
+        now = timezone.now()
+        statuses = self.get_status_many(users, chunk_size=chunk_size)
+        return {
+            pk: status.change_required or status.is_expired(now)
+            for pk, status in statuses.items()
+        }
+
+    def get_status_subqueries(self):
+        """
+Gets the subqueries used to determine the password status of users.
+
+Both refer to the primary key of the user of an outer queryset.
+
+:returns: A tuple of a :class:`~django.db.models.Subquery` selecting the date
+  and time the password was last changed, if known, and an
+  :class:`~django.db.models.Exists` expression checking if a password
+  change is enforced.
+:rtype: tuple
+"""
+        apps = self.model._meta.apps
+        change_required_model = apps.get_model(
+            "password_policies", "PasswordChangeRequired"
+        )
+        if settings.PASSWORD_USE_PROFILE:
+            profile_model = apps.get_model("password_policies", "PasswordProfile")
+            newest = profile_model.objects.filter(user=OuterRef("pk"))
+            newest = newest.values("last_changed")
+        else:
+            newest = self.filter(user=OuterRef("pk")).order_by("-created")
+            newest = newest.values("created")
+        required = change_required_model.objects.filter(user=OuterRef("pk"))
+        return Subquery(newest[:1]), Exists(required)
+
+    def _get_status_queryset(self, **filters):
+        user_model = self.model._meta.get_field("user").related_model
+        newest, required = self.get_status_subqueries()
+        return user_model._default_manager.filter(**filters).annotate(
+            newest_password=newest,
+            password_enforced=required,
+        )
+
+    def _make_status(self, user, row):
+        last_changed, change_required = row or (None, False)
+        if last_changed is None:
+            # TODO: Do not rely on this property!
+            last_changed = user.date_joined
+        return self._make_status_from(last_changed, change_required)
+
+    def _make_status_from(self, last_changed, change_required):
+        expires_at = last_changed + timedelta(seconds=settings.PASSWORD_DURATION_SECONDS)
+        return PasswordStatus(bool(change_required), last_changed, expires_at)
 
     def get_newest(self, user):
         """
@@ -83,3 +435,13 @@ Gets the newest password history entry.
         except ObjectDoesNotExist:
             return None
         return entry
+
+    async def aget_newest(self, user):
+        """
+Asynchronous version of :meth:`get_newest`.
+"""
+        try:
+            entry = await self.filter(user=user).alatest()
+        except ObjectDoesNotExist:
+            return None
+        return entry
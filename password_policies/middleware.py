@@ -1,28 +1,168 @@
+import logging
 import re
 from datetime import timedelta
+from functools import lru_cache
 
 try:
     from django.urls.base import reverse, resolve, NoReverseMatch, Resolver404
+    from django.urls.base import get_script_prefix, get_urlconf
+    from django.urls.resolvers import get_resolver
 except ImportError:
     # Before Django 2.0
     from django.core.urlresolvers import NoReverseMatch, Resolver404, resolve, reverse
+    from django.core.urlresolvers import get_resolver, get_script_prefix, get_urlconf
+
+try:
+    from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+except ImportError:
+    # Before asgiref 3.6
+    from asyncio import iscoroutinefunction
+    from asyncio.coroutines import _is_coroutine
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = _is_coroutine
+        return func
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    # Before Django 3.0, which only serves WSGI requests.
+    sync_to_async = None
 
 from django.http import HttpResponseRedirect
 from django.utils import timezone
 
-import django.utils.deprecation
-if hasattr(django.utils.deprecation, 'MiddlewareMixin'):
-    from django.utils.deprecation import MiddlewareMixin
-else:
-    MiddlewareMixin = object
-
 from django.conf import settings as django_setings
 
+from password_policies.cache import aget_status_version, get_status_version
 from password_policies.conf import settings
 from password_policies.models import PasswordChangeRequired, PasswordHistory
-from password_policies.utils import PasswordCheck, string_to_datetime, datetime_to_string
+from password_policies.utils import (
+    aget_password_status,
+    datetime_to_timestamp,
+    get_password_status,
+    set_session_value,
+    timestamp_to_datetime,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ExcludedPathMatcher(object):
+    """
+    Matches request paths against all paths excluded from password
+    change checks.
+
+    The paths are folded into a single compiled regular expression
+    including the password change URL, ``MEDIA_URL``, ``STATIC_URL``,
+    the logout URLs (if
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_CHANGE_MIDDLEWARE_ALLOW_LOGOUT`
+    is set) and
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS`.
+    Paths containing groups, e.g. for backreferences, are matched one by
+    one instead.
+
+    Use :func:`get_excluded_path_matcher` to get a cached instance."""
+
+    def __init__(self):
+        #: The URL of the password change view.
+        self.url = reverse("password_change")
+        paths = list(settings.PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS)
+        paths.append(r"^%s$" % self.url)
+        media_url = django_setings.MEDIA_URL
+        if media_url:
+            paths.append(r"^%s?" % media_url)
+        static_url = django_setings.STATIC_URL
+        if static_url:
+            paths.append(r"^%s?" % static_url)
+        if settings.PASSWORD_CHANGE_MIDDLEWARE_ALLOW_LOGOUT:
+            try:
+                logout_url = reverse("logout")
+            except NoReverseMatch:
+                pass
+            else:
+                paths.append(r"^%s$" % logout_url)
+            try:
+                logout_url = u"/admin/logout/"
+                resolve(logout_url)
+            except Resolver404:
+                pass
+            else:
+                paths.append(r"^%s$" % logout_url)
+        self.paths = paths
+        self.patterns = [re.compile(path) for path in paths]
+        self.pattern = None
+        # Combining patterns renumbers their groups, which breaks
+        # backreferences, match them one by one instead.
+        if not any(pattern.groups for pattern in self.patterns):
+            try:
+                self.pattern = re.compile("|".join("(?:%s)" % path for path in paths))
+            except re.error:
+                # Some patterns (e.g. using global flags) can not be
+                # combined either.
+                pass
+
+    def match(self, path):
+        """
+        :arg str path: A request path.
+        :returns: ``True`` if the path is excluded, ``False`` otherwise.
+        :rtype: bool"""
+        if self.pattern is not None:
+            return self.pattern.match(path) is not None
+        return any(pattern.match(path) for pattern in self.patterns)
+
+
+@lru_cache(maxsize=32)
+def _get_excluded_path_matcher(resolver, script_prefix):
+    return ExcludedPathMatcher()
 
-class PasswordChangeMiddleware(MiddlewareMixin):
+
+def get_excluded_path_matcher():
+    """
+    Returns the :class:`ExcludedPathMatcher` of the active URLconf.
+
+    Matchers are built once per URL resolver and script prefix, as the
+    reversed URLs depend on both, so they are rebuilt whenever the URLconf
+    changes or the URL caches are cleared. Changes to the settings clear the
+    cache using :func:`clear_excluded_path_matchers`."""
+    return _get_excluded_path_matcher(
+        get_resolver(get_urlconf()), get_script_prefix()
+    )
+
+
+def clear_excluded_path_matchers():
+    "Clears all cached :class:`ExcludedPathMatcher` instances."
+    _get_excluded_path_matcher.cache_clear()
+
+
+class PasswordChangeState(object):
+    """
+    Holds the state of a single request processed by the
+    :middleware:`PasswordChangeMiddleware`.
+
+    A middleware instance serves all requests of a process, thus
+    anything specific to a request is kept here instead of on the
+    middleware itself.
+
+    :arg request: A HttpRequest instance.
+    :arg str url: The URL of the password change view.
+    :arg now: The date and time of the request. Defaults to now.
+    :arg user: The user of the request. Defaults to ``request.user``."""
+
+    def __init__(self, request, url, now=None, user=None):
+        self.request = request
+        self.session = request.session
+        self.user = user or request.user
+        self.url = url
+        #: The date and time of the request.
+        self.now = now or timezone.now()
+        #: Passwords changed before this date and time have expired.
+        self.expiry_datetime = self.now - timedelta(
+            seconds=settings.PASSWORD_DURATION_SECONDS
+        )
+
+
+class PasswordChangeMiddleware(object):
     """
     A middleware to force a password change.
 
@@ -31,6 +171,10 @@ class PasswordChangeMiddleware(MiddlewareMixin):
     If the user has no password history it is assumed that the
     password was last changed when the user has or was registered.
 
+    The result of a check is stored in the user's session and reused for
+    :py:attr:`~password_policies.conf.Settings.PASSWORD_CHECK_SECONDS`,
+    unless a password change is enforced in the meantime.
+
     .. note::
         This only works on a GET HTTP method. Redirections on a
         HTTP POST are tricky, so the risk of messing up a POST
@@ -67,123 +211,203 @@ class PasswordChangeMiddleware(MiddlewareMixin):
 
     .. warning::
         This middleware does not try to redirect using the HTTPS
-        protocol."""
+        protocol.
+
+    The middleware supports both synchronous and asynchronous requests.
+    Served by ASGI it uses the asynchronous APIs of the ORM, the cache,
+    the session and the authentication (Django 5.1 or higher) and does
+    not block the event loop."""
 
     checked = settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY
     expired = settings.PASSWORD_POLICIES_EXPIRED_SESSION_KEY
     last = settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY
     required = settings.PASSWORD_POLICIES_CHANGE_REQUIRED_SESSION_KEY
+    version = settings.PASSWORD_POLICIES_STATUS_VERSION_SESSION_KEY
     td = timedelta(seconds=settings.PASSWORD_DURATION_SECONDS)
 
-    def _check_history(self, request):
-        if not request.session.get(self.last, None):
-            newest = PasswordHistory.objects.get_newest(request.user)
-            if newest:
-                request.session[self.last] = datetime_to_string(newest.created)
-            else:
-                # TODO: This relies on request.user.date_joined which might not
-                # be available!!!
-                request.session[self.last] = datetime_to_string(request.user.date_joined)
-
-        date_last = string_to_datetime(request.session[self.last])
-        if date_last < self.expiry_datetime:
-            request.session[self.required] = True
-            if not PasswordChangeRequired.objects.filter(user=request.user).count():
-                PasswordChangeRequired.objects.create(user=request.user)
-        else:
-            request.session[self.required] = False
-
-    def _check_necessary(self, request):
-
-        if not request.session.get(self.checked, None):
-            request.session[self.checked] = datetime_to_string(self.now)
-
-            #  If the PASSWORD_CHECK_ONLY_AT_LOGIN is set, then only check at the beginning of session, which we can
-            #  tell by self.now time having just been set.
-        if (
-            not settings.PASSWORD_CHECK_ONLY_AT_LOGIN
-            or request.session.get(self.checked, None) == datetime_to_string(self.now)
-        ):
-            # If a password change is enforced we won't check
-            # the user's password history, thus reducing DB hits...
-            if PasswordChangeRequired.objects.filter(user=request.user).count():
-                request.session[self.required] = True
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+        self.async_mode = get_response is not None and iscoroutinefunction(
+            get_response
+        )
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.process_request(request)
+        return response or self.get_response(request)
+
+    async def __acall__(self, request):
+        response = await self.aprocess_request(request)
+        return response or await self.get_response(request)
+
+    def _check_necessary(self, state):
+        if self._is_checked_at_login(state):
+            return
+        # Read the version before querying the database, so a change
+        # made in the meantime forces another check on the next request.
+        # Without an interval there is nothing to invalidate.
+        version = None
+        if settings.PASSWORD_CHECK_SECONDS:
+            try:
+                version = get_status_version(state.user.pk)
+            except Exception:
+                self._log_cache_error(state)
+                self._set_checked(state, None)
+                status = PasswordHistory.objects.get_status(state.user)
+                if self._set_required(state, status):
+                    PasswordChangeRequired.objects.enforce(state.user)
                 return
+        if self._is_checked_recently(state, version):
+            return
+        self._set_checked(state, version)
+        status = get_password_status(state.user)
+        if self._set_required(state, status):
+            PasswordChangeRequired.objects.enforce(state.user)
 
-            date_checked = string_to_datetime(request.session[self.checked])
-            if date_checked < self.expiry_datetime:
-                try:
-                    del request.session[self.last]
-                    del request.session[self.checked]
-                    del request.session[self.required]
-                    del request.session[self.expired]
-                except KeyError:
-                    pass
-
-            if settings.PASSWORD_USE_HISTORY:
-                self._check_history(request)
-        else:
+    async def _acheck_necessary(self, state):
+        # Loads the session without blocking, all further session
+        # access is served from memory.
+        await state.session.aget(self.checked)
+        if self._is_checked_at_login(state):
+            return
+        version = None
+        if settings.PASSWORD_CHECK_SECONDS:
+            try:
+                version = await aget_status_version(state.user.pk)
+            except Exception:
+                self._log_cache_error(state)
+                self._set_checked(state, None)
+                status = await PasswordHistory.objects.aget_status(state.user)
+                if self._set_required(state, status):
+                    await PasswordChangeRequired.objects.aenforce(state.user)
+                return
+        if self._is_checked_recently(state, version):
+            return
+        self._set_checked(state, version)
+        status = await aget_password_status(state.user)
+        if self._set_required(state, status):
+            await PasswordChangeRequired.objects.aenforce(state.user)
+
+    def _is_checked_at_login(self, state):
+        if settings.PASSWORD_CHECK_ONLY_AT_LOGIN and state.session.get(self.checked):
             # In the case where PASSWORD_CHECK_ONLY_AT_LOGIN is true, the required key is not removed,
             # therefore causing a never ending password update loop
-            request.session[self.required] = False
+            set_session_value(state.session, self.required, False)
+            return True
+        return False
+
+    def _log_cache_error(self, state):
+        # The result of the check is not reused until the cache is
+        # available again, the database is queried on each request.
+        logger.warning(
+            "Could not read the password status version of user %s, "
+            "checking the password status without the cache.",
+            state.user.pk,
+            exc_info=True,
+        )
+
+    def _is_checked_recently(self, state, version):
+        """
+        Checks if the result of the last check stored in the session can be
+        reused, which is the case for
+        :py:attr:`~password_policies.conf.Settings.PASSWORD_CHECK_SECONDS`
+        unless the user's password status has been modified since."""
+        date_checked = state.session.get(self.checked)
+        if not date_checked or not settings.PASSWORD_CHECK_SECONDS:
+            return False
+        if self.required not in state.session:
+            return False
+        interval = timedelta(seconds=settings.PASSWORD_CHECK_SECONDS)
+        if timestamp_to_datetime(date_checked) <= state.now - interval:
+            return False
+        return state.session.get(self.version) == version
 
     def _is_excluded_path(self, actual_path):
-        paths = settings.PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS[:]
-        path = r"^%s$" % self.url
-        paths.append(path)
-        media_url = django_setings.MEDIA_URL
-        if media_url:
-            paths.append(r"^%s?" % media_url)
-        static_url = django_setings.STATIC_URL
-        if static_url:
-            paths.append(r"^%s?" % static_url)
-        if settings.PASSWORD_CHANGE_MIDDLEWARE_ALLOW_LOGOUT:
-            try:
-                logout_url = reverse("logout")
-            except NoReverseMatch:
-                pass
-            else:
-                paths.append(r"^%s$" % logout_url)
-            try:
-                logout_url = u"/admin/logout/"
-                resolve(logout_url)
-            except Resolver404:
-                pass
-            else:
-                paths.append(r"^%s$" % logout_url)
-        for path in paths:
-            if re.match(path, actual_path):
-                return True
-        return False
+        return get_excluded_path_matcher().match(actual_path)
+
+    def _is_processed(self, request):
+        if request.method != "GET":
+            return False
+        try:
+            resolve(request.path_info)
+        except Resolver404:
+            return False
+        if not settings.PASSWORD_DURATION_SECONDS:
+            return False
+        return True
 
-    def _redirect(self, request):
-        if request.session[self.required]:
+    def _redirect(self, state):
+        if state.session[self.required]:
+            request = state.request
             redirect_to = request.GET.get(settings.REDIRECT_FIELD_NAME, "")
             if redirect_to:
                 next_to = redirect_to
             else:
                 next_to = request.get_full_path()
-            url = "%s?%s=%s" % (self.url, settings.REDIRECT_FIELD_NAME, next_to)
+            url = "%s?%s=%s" % (state.url, settings.REDIRECT_FIELD_NAME, next_to)
             return HttpResponseRedirect(url)
 
+    def _set_checked(self, state, version):
+        session = state.session
+        if not session.get(self.checked) or settings.PASSWORD_CHECK_SECONDS:
+            set_session_value(session, self.checked, datetime_to_timestamp(state.now))
+        if version is not None:
+            set_session_value(session, self.version, version)
+
+    def _set_required(self, state, status):
+        """
+        Stores the result of a check in the session.
+
+        :returns: ``True`` if the password has expired and a password change
+          has to be enforced, ``False`` otherwise.
+        :rtype: bool"""
+        session = state.session
+        # If a password change is enforced we won't check
+        # the user's password history...
+        if status.change_required:
+            set_session_value(session, self.required, True)
+            return False
+        if settings.PASSWORD_USE_HISTORY or settings.PASSWORD_USE_PROFILE:
+            set_session_value(
+                session, self.last, datetime_to_timestamp(status.last_changed)
+            )
+            if status.last_changed < state.expiry_datetime:
+                set_session_value(session, self.required, True)
+                return True
+        set_session_value(session, self.required, False)
+        return False
+
     def process_request(self, request):
-        if request.method != "GET":
-            return
-        try:
-            resolve(request.path_info)
-        except Resolver404:
+        if not self._is_processed(request) or not request.user.is_authenticated:
             return
-        self.now = timezone.now()
-        self.url = reverse("password_change")
+        if not self._is_excluded_path(request.path):
+            state = PasswordChangeState(request, get_excluded_path_matcher().url)
+            self._check_necessary(state)
+            return self._redirect(state)
 
-        auth = request.user.is_authenticated
-
-        if (
-            settings.PASSWORD_DURATION_SECONDS
-            and auth
-            and not self._is_excluded_path(request.path)
-        ):
-            self.check = PasswordCheck(request.user)
-            self.expiry_datetime = self.check.get_expiry_datetime()
-            self._check_necessary(request)
-            return self._redirect(request)
+    async def aprocess_request(self, request):
+        """
+        Asynchronous version of :meth:`process_request`.
+
+        Falls back to running :meth:`process_request` in a thread if the
+        session or the authentication do not provide asynchronous APIs
+        (before Django 5.1)."""
+        if not hasattr(request, "auser") or not hasattr(request.session, "aget"):
+            return await sync_to_async(self.process_request)(request)
+        if not self._is_processed(request):
+            return
+        user = await request.auser()
+        if not user.is_authenticated:
+            return
+        if not self._is_excluded_path(request.path):
+            state = PasswordChangeState(
+                request, get_excluded_path_matcher().url, user=user
+            )
+            await self._acheck_necessary(state)
+            return self._redirect(state)
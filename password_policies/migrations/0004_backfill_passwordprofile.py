@@ -0,0 +1,66 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import migrations
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def backfill_password_profiles(apps, schema_editor):
+    """
+    Creates missing password profiles and sets the date of the last
+    password change from the newest password history entry.
+    """
+    db = schema_editor.connection.alias
+    user_model = apps.get_model(settings.AUTH_USER_MODEL)
+    PasswordHistory = apps.get_model("password_policies", "PasswordHistory")
+    PasswordProfile = apps.get_model("password_policies", "PasswordProfile")
+    history = PasswordHistory.objects.using(db)
+    profiles = PasswordProfile.objects.using(db)
+    newest = Subquery(
+        history.filter(user=OuterRef("user"))
+        .order_by("-created")
+        .values("created")[:1]
+    )
+
+    # Profiles of existing users having a newer password history entry.
+    newer = history.filter(user=OuterRef("user"), created__gt=OuterRef("last_changed"))
+    profiles.annotate(newer=Exists(newer)).filter(newer=True).update(
+        last_changed=newest
+    )
+
+    # Users registered before password profiles have been introduced.
+    started = timezone.now()
+    missing = user_model._default_manager.using(db).exclude(
+        pk__in=profiles.values("user")
+    )
+    pks = missing.values_list("pk", flat=True).iterator()
+    while True:
+        batch = [PasswordProfile(user_id=pk) for pk in islice(pks, 1000)]
+        if not batch:
+            break
+        profiles.bulk_create(batch)
+    last_changed = newest
+    try:
+        user_model._meta.get_field("date_joined")
+    except FieldDoesNotExist:
+        pass
+    else:
+        joined = user_model._default_manager.using(db).filter(pk=OuterRef("user"))
+        last_changed = Coalesce(newest, Subquery(joined.values("date_joined")[:1]))
+    created = profiles.filter(created__gte=started).annotate(value=last_changed)
+    created.exclude(value=None).update(last_changed=last_changed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('password_policies', '0003_update_passwordprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_password_profiles, migrations.RunPython.noop),
+    ]
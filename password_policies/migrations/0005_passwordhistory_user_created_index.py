@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_policies', '0004_backfill_passwordprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passwordhistory',
+            index=models.Index(fields=['user', '-created'], name='password_history_user_created'),
+        ),
+    ]
@@ -9,8 +9,12 @@ except ImportError:
     # Before in Django 3.0
     from django.utils.translation import ugettext_lazy as _
 
+from password_policies.cache import bump_status_version
 from password_policies.conf import settings
-from password_policies.managers import PasswordHistoryManager
+from password_policies.managers import (
+    PasswordChangeRequiredManager,
+    PasswordHistoryManager,
+)
 
 
 class PasswordChangeRequired(models.Model):
@@ -33,6 +37,8 @@ class PasswordChangeRequired(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = PasswordChangeRequiredManager()
+
     class Meta:
         get_latest_by = "created"
         ordering = ["-created"]
@@ -69,6 +75,11 @@ class PasswordHistory(models.Model):
 
     class Meta:
         get_latest_by = "created"
+        indexes = [
+            models.Index(
+                fields=["user", "-created"], name="password_history_user_created"
+            ),
+        ]
         ordering = ["-created"]
         verbose_name = _("password history entry")
         verbose_name_plural = _("password history entries")
@@ -113,13 +124,35 @@ def create_password_profile_signal(sender, instance, created, **kwargs):
         PasswordProfile.objects.create(user=instance, last_changed=now, created=now)
 
 
-def password_change_signal(sender, instance, **kwargs):
+def is_password_rehash(instance, update_fields=None):
+    """
+    Checks if a user is saved because Django upgraded the hash of the
+    user's password while checking it, e.g. after the iterations of the
+    password hasher were increased.
+
+    ``User.check_password`` sets the password again and clears the raw
+    password kept by ``set_password`` before saving only the password.
+
+    :arg instance: A :class:`~django.contrib.auth.models.User` instance.
+    :arg update_fields: The fields passed to ``save``.
+    :returns: ``True`` if the password itself has not changed, ``False``
+      otherwise.
+    :rtype: bool"""
+    if not update_fields or set(update_fields) != {settings.PASSWORD_MODEL_FIELD}:
+        return False
+    return getattr(instance, "_password", None) is None
+
+
+def password_change_signal(sender, instance, update_fields=None, **kwargs):
     user_model = get_user_model()
     try:
         user = user_model.objects.get(pk=instance.pk)
         password1 = getattr(user, settings.PASSWORD_MODEL_FIELD)
         password2 = getattr(instance, settings.PASSWORD_MODEL_FIELD)
         if not password1 == password2:
+            if is_password_rehash(instance, update_fields):
+                return
+            instance._password_policies_changed = True
             profile, _ign = PasswordProfile.objects.get_or_create(user=instance)
             profile.last_changed = timezone.now()
             profile.save()
@@ -127,6 +160,18 @@ def password_change_signal(sender, instance, **kwargs):
         pass
 
 
+def password_history_signal(sender, instance, created, **kwargs):
+    changed = instance.__dict__.pop("_password_policies_changed", False)
+    if not settings.PASSWORD_USE_HISTORY or not settings.PASSWORD_HISTORY_RECORD_ON_SAVE:
+        return
+    if created or changed:
+        PasswordHistory.objects.record(instance)
+
+
+def password_status_signal(sender, instance, **kwargs):
+    bump_status_version(instance.user_id)
+
+
 signals.pre_save.connect(
     password_change_signal,
     sender=django_settings.AUTH_USER_MODEL,
@@ -138,3 +183,45 @@ signals.post_save.connect(
     sender=django_settings.AUTH_USER_MODEL,
     dispatch_uid="create_password_profile_signal",
 )
+
+signals.post_save.connect(
+    password_history_signal,
+    sender=django_settings.AUTH_USER_MODEL,
+    dispatch_uid="password_history_signal",
+)
+
+signals.post_save.connect(
+    password_status_signal,
+    sender=PasswordChangeRequired,
+    dispatch_uid="password_change_required_save_signal",
+)
+
+signals.post_delete.connect(
+    password_status_signal,
+    sender=PasswordChangeRequired,
+    dispatch_uid="password_change_required_delete_signal",
+)
+
+signals.post_save.connect(
+    password_status_signal,
+    sender=PasswordHistory,
+    dispatch_uid="password_history_save_signal",
+)
+
+signals.post_delete.connect(
+    password_status_signal,
+    sender=PasswordHistory,
+    dispatch_uid="password_history_delete_signal",
+)
+
+signals.post_save.connect(
+    password_status_signal,
+    sender=PasswordProfile,
+    dispatch_uid="password_profile_save_signal",
+)
+
+signals.post_delete.connect(
+    password_status_signal,
+    sender=PasswordProfile,
+    dispatch_uid="password_profile_delete_signal",
+)
@@ -11,3 +11,14 @@ def app_settings_reload_handler(**kwargs):
     """
     if "PASSWORD_" in kwargs['setting']:
         importlib.reload(password_settings)
+
+
+@receiver(setting_changed)
+def excluded_path_matchers_reset_handler(**kwargs):
+    """
+    Drops the cached path matchers of the middleware when a setting
+    they are built from is modified.
+    """
+    if "PASSWORD_" in kwargs['setting'] or kwargs['setting'] in ("MEDIA_URL", "STATIC_URL"):
+        from .middleware import clear_excluded_path_matchers
+        clear_excluded_path_matchers()
@@ -1,8 +1,12 @@
+from contextlib import contextmanager
 from datetime import timedelta
 from random import randint
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
+from django.core.cache.backends.base import BaseCache
+from django.core.exceptions import FieldDoesNotExist
 from django.utils import timezone
 
 from password_policies.conf import settings
@@ -28,6 +32,33 @@ passwords = [
 ]
 
 
+class FailingCache(BaseCache):
+    "A cache backend failing like an unreachable cache server."
+
+    def __init__(self, location, params):
+        super(FailingCache, self).__init__(params)
+
+    def _fail(self, *args, **kwargs):
+        raise ConnectionError("The cache is not available.")
+
+    add = get = set = delete = incr = clear = _fail
+
+
+@contextmanager
+def without_date_joined():
+    "Hides the ``date_joined`` field of the user model, like custom user models."
+    opts = get_user_model()._meta
+    get_field = opts.get_field
+
+    def get_field_except_date_joined(name, *args, **kwargs):
+        if name == "date_joined":
+            raise FieldDoesNotExist(name)
+        return get_field(name, *args, **kwargs)
+
+    with mock.patch.object(opts, "get_field", side_effect=get_field_except_date_joined):
+        yield
+
+
 def create_user(
     username="alice",
     email="alice@example.com",
@@ -0,0 +1,103 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from password_policies.forms.similarity import CompiledIndex, is_compiled_dictionary
+from password_policies.models import PasswordHistory
+from password_policies.tests.lib import create_password_history, create_user, passwords
+
+
+class PrunePasswordHistoryCommandTest(TestCase):
+    def setUp(self):
+        self.users = [create_user(), create_user(username="bob")]
+        for user in self.users:
+            create_password_history(user, passwords[:5])
+
+    def call_command(self, *args):
+        stdout = StringIO()
+        call_command("prune_password_history", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_prune_password_history(self):
+        output = self.call_command("--offset=2", "--chunk-size=1")
+        for user in self.users:
+            self.assertEqual(PasswordHistory.objects.filter(user=user).count(), 2)
+        self.assertIn("Processed 1 users, deleted 3 entries", output)
+        self.assertIn("Deleted 6 expired entries of 2 users", output)
+
+    def test_prune_password_history_batch_size(self):
+        with mock.patch.object(
+            PasswordHistory.objects,
+            "delete_expired_many",
+            wraps=PasswordHistory.objects.delete_expired_many,
+        ) as delete_expired_many:
+            output = self.call_command("--offset=2", "--batch-size=4")
+        # 6 entries: a full batch and the rest
+        self.assertEqual(
+            [call.kwargs["limit"] for call in delete_expired_many.call_args_list], [4, 4]
+        )
+        self.assertEqual(PasswordHistory.objects.count(), 4)
+        self.assertIn("Deleted 6 expired entries of 2 users", output)
+
+    def test_prune_password_history_keeps_newest(self):
+        newest = PasswordHistory.objects.get_newest(self.users[0])
+        self.call_command("--offset=1")
+        self.assertEqual(PasswordHistory.objects.get_newest(self.users[0]), newest)
+        self.assertEqual(PasswordHistory.objects.count(), 2)
+
+    def test_prune_password_history_dry_run(self):
+        output = self.call_command("--offset=2", "--dry-run")
+        self.assertEqual(PasswordHistory.objects.count(), 10)
+        self.assertIn("Found 6 expired entries of 2 users", output)
+
+    def test_prune_password_history_sleep(self):
+        with mock.patch(
+            "password_policies.management.commands.prune_password_history.time.sleep"
+        ) as sleep:
+            self.call_command("--chunk-size=1", "--sleep=0.5")
+        self.assertEqual(sleep.call_count, 2)
+        sleep.assert_called_with(0.5)
+
+    def test_prune_password_history_invalid_offset(self):
+        with self.assertRaises(CommandError):
+            self.call_command("--offset=0")
+
+
+class CompilePasswordDictionaryCommandTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "words")
+        with open(self.path, "w") as dictionary:
+            dictionary.write("Dragon\nmonkey\ndragon\n\npassword\n")
+
+    def call_command(self, *args):
+        stdout = StringIO()
+        call_command("compile_password_dictionary", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_compile_password_dictionary(self):
+        output = self.call_command(self.path)
+        compiled = self.path + ".compiled"
+        self.assertTrue(is_compiled_dictionary(compiled))
+        self.assertIn("Compiled 3 of 5 words into %s" % compiled, output)
+        index = CompiledIndex(compiled)
+        self.assertEqual(list(index.words), ["dragon", "monkey", "password"])
+
+    def test_compile_password_dictionary_output(self):
+        compiled = self.path + ".bin"
+        self.call_command(self.path, "--output", compiled)
+        self.assertTrue(is_compiled_dictionary(compiled))
+        with self.assertRaisesMessage(CommandError, "is already compiled"):
+            self.call_command(compiled)
+
+    def test_compile_password_dictionary_missing(self):
+        with self.assertRaisesMessage(CommandError, "does not exist"):
+            self.call_command(self.path + ".missing")
+        with self.assertRaisesMessage(CommandError, "PASSWORD_DICTIONARY is not set"):
+            self.call_command()
@@ -1,3 +1,6 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
 from django.test import TestCase
 from django.test.utils import override_settings
 
@@ -12,6 +15,7 @@ from password_policies.forms import (
     PasswordResetForm,
 )
 from password_policies.forms.fields import PasswordPoliciesField
+from password_policies.models import PasswordHistory
 from password_policies.tests.lib import create_password_history, create_user, passwords
 
 
@@ -189,6 +193,27 @@ class PasswordPoliciesChangeFormTest(TestCase):
         form = PasswordPoliciesChangeForm(self.user, data)
         self.assertTrue(form.is_valid())
 
+    def test_password_hashed_once(self):
+        history = passwords[:4]
+        create_password_history(self.user, history)
+        data = {
+            "old_password": passwords[-1],
+            "new_password1": "Chah+pher9k",
+            "new_password2": "Chah+pher9k",
+        }
+        form = PasswordPoliciesChangeForm(self.user, data)
+        with mock.patch.object(
+            PBKDF2PasswordHasher, "encode", autospec=True, side_effect=PBKDF2PasswordHasher.encode
+        ) as encode:
+            self.assertTrue(form.is_valid())
+            form.save()
+        # old and new password against the current one, the history
+        # and the new password
+        self.assertEqual(encode.call_count, 2 + len(history) + 1)
+        entry = PasswordHistory.objects.get_newest(self.user)
+        self.assertEqual(entry.password, self.user.password)
+        self.assertTrue(self.user.check_password("Chah+pher9k"))
+
 
 class PasswordResetFormTest(TestCase):
     def setUp(self):
@@ -0,0 +1,147 @@
+import threading
+import unittest
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from password_policies.hashers import (
+    PasswordVerificationContext,
+    find_match,
+    get_executor,
+    must_update_history_password,
+    verify_any,
+)
+from password_policies.models import PasswordHistory
+from password_policies.tests.lib import create_password_history, create_user, passwords
+
+
+@override_settings(PASSWORD_HISTORY_CHECK_WORKERS=2)
+class PasswordPoliciesVerifyAnyTest(SimpleTestCase):
+    def setUp(self):
+        self.encoded = ["encoded%d" % i for i in range(10)]
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def verify_password(self, raw_password, encoded):
+        if encoded == raw_password:
+            return True
+        self.release.wait(timeout=10)
+        return False
+
+    def test_verify_any_shared_executor(self):
+        self.assertIs(get_executor(), get_executor())
+        self.assertEqual(get_executor()._max_workers, 2)
+
+    def test_verify_any(self):
+        encoded = [make_password(password) for password in passwords[:3]]
+        self.assertEqual(find_match(passwords[2], encoded), encoded[2])
+        self.assertIsNone(find_match(passwords[3], encoded))
+        self.assertTrue(verify_any(passwords[2], encoded))
+        self.assertFalse(verify_any(passwords[3], encoded))
+        self.assertFalse(verify_any(passwords[3], []))
+
+    def test_verify_any_cancels_remaining_checks(self):
+        with mock.patch(
+            "password_policies.hashers.verify_password",
+            side_effect=self.verify_password,
+        ) as verify_password:
+            self.assertTrue(verify_any("encoded0", self.encoded))
+            self.release.set()
+            get_executor().submit(lambda: None).result()
+        # the match and the checks picked up by the workers meanwhile
+        self.assertLess(verify_password.call_count, len(self.encoded))
+
+
+class PasswordVerificationContextTest(SimpleTestCase):
+    def test_find_match_memoized(self):
+        context = PasswordVerificationContext()
+        encoded = [make_password(password) for password in passwords[:2]]
+        with mock.patch(
+            "password_policies.hashers.verify_password", return_value=False
+        ) as verify_password:
+            self.assertIsNone(context.find_match(passwords[3], encoded))
+            self.assertIsNone(context.find_match(passwords[3], encoded))
+        self.assertEqual(verify_password.call_count, 2)
+
+
+class PasswordPoliciesHistoryCheckTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        create_password_history(self.user, passwords[:4])
+
+    @override_settings(PASSWORD_HISTORY_CHECK_WORKERS=4)
+    def test_check_password_concurrently(self):
+        self.assertFalse(PasswordHistory.objects.check_password(self.user, passwords[0]))
+        self.assertFalse(PasswordHistory.objects.check_password(self.user, passwords[3]))
+        self.assertTrue(PasswordHistory.objects.check_password(self.user, passwords[5]))
+
+    def test_check_password_sequentially(self):
+        self.assertFalse(PasswordHistory.objects.check_password(self.user, passwords[0]))
+        self.assertTrue(PasswordHistory.objects.check_password(self.user, passwords[5]))
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ],
+    PASSWORD_HISTORY_HASHER="pbkdf2_sha1",
+)
+class PasswordHistoryHasherTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.entries = [
+            PasswordHistory.objects.create(
+                user=self.user, password=make_password(password, hasher="pbkdf2_sha256")
+            )
+            for password in passwords[:2]
+        ]
+
+    def test_must_update_history_password(self):
+        self.assertTrue(must_update_history_password(self.entries[0].password))
+        encoded = make_password(passwords[0], hasher="pbkdf2_sha1")
+        self.assertFalse(must_update_history_password(encoded))
+
+    def test_record_history_hasher(self):
+        self.user.set_password(passwords[5])
+        entry = PasswordHistory.objects.record(self.user, passwords[5])
+        self.assertTrue(entry.password.startswith("pbkdf2_sha1$"))
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+    @override_settings(
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ],
+        PASSWORD_HISTORY_HASHER="md5",
+    )
+    def test_record_insecure_history_hasher(self):
+        self.user.set_password(passwords[5])
+        with self.assertRaises(ImproperlyConfigured):
+            PasswordHistory.objects.record(self.user, passwords[5])
+        self.assertFalse(
+            PasswordHistory.objects.filter(password__startswith="md5$").exists()
+        )
+
+    def test_check_password_rehashes_match(self):
+        self.assertFalse(PasswordHistory.objects.check_password(self.user, passwords[1]))
+        for entry in self.entries:
+            entry.refresh_from_db()
+        self.assertTrue(self.entries[0].password.startswith("pbkdf2_sha256$"))
+        self.assertTrue(self.entries[1].password.startswith("pbkdf2_sha1$"))
+        self.assertFalse(PasswordHistory.objects.check_password(self.user, passwords[1]))
+
+    @unittest.skipUnless(hasattr(QuerySet, "aget"), "requires Django 4.1 or higher")
+    async def test_acheck_password_rehashes_match(self):
+        self.assertFalse(
+            await PasswordHistory.objects.acheck_password(self.user, passwords[0])
+        )
+        self.assertTrue(
+            await PasswordHistory.objects.acheck_password(self.user, passwords[5])
+        )
+        entry = await PasswordHistory.objects.aget(pk=self.entries[0].pk)
+        self.assertTrue(entry.password.startswith("pbkdf2_sha1$"))
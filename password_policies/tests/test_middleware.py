@@ -1,3 +1,9 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
 
 try:
@@ -6,21 +12,39 @@ except ImportError:
     from urlparse import urljoin
 
 try:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import get_script_prefix, reverse, set_script_prefix
 except ImportError:
-    from django.urls.base import reverse
+    from django.urls.base import get_script_prefix, reverse, set_script_prefix
 
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.base import SessionBase
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.test.utils import override_settings
 from django.utils import timezone
+from freezegun import freeze_time
 
+from password_policies.checks import check_password_cache
 from password_policies.conf import settings
-from password_policies.models import PasswordChangeRequired, PasswordHistory
+from password_policies.managers import PasswordStatus
+from password_policies.middleware import (
+    PasswordChangeMiddleware,
+    get_excluded_path_matcher,
+    iscoroutinefunction,
+)
+from password_policies.models import (
+    PasswordChangeRequired,
+    PasswordHistory,
+    PasswordProfile,
+)
 from password_policies.tests.lib import (
     create_password_history,
     create_user,
     get_datetime_from_delta,
     passwords,
 )
+from password_policies.utils import timestamp_to_datetime
 
 
 def get_response_location(location):
@@ -117,3 +141,361 @@ class PasswordPoliciesMiddlewareJsonSerializerTest(TestCase):
         self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
         self.client.logout()
         p.delete()
+
+
+class PasswordPoliciesMiddlewareExcludedPathsTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+
+    def test_excluded_path_matcher_is_cached(self):
+        matcher = get_excluded_path_matcher()
+        self.assertIs(matcher, get_excluded_path_matcher())
+        self.assertEqual(matcher.url, reverse("password_change"))
+        self.assertTrue(matcher.match(reverse("password_change")))
+        self.assertTrue(matcher.match("/media/somewhere/image.png"))
+        self.assertFalse(matcher.match(reverse("home")))
+
+    def test_excluded_path_matcher_settings_changed(self):
+        matcher = get_excluded_path_matcher()
+        with override_settings(PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS=[r"^/$"]):
+            self.assertIsNot(matcher, get_excluded_path_matcher())
+            self.assertTrue(get_excluded_path_matcher().match(reverse("home")))
+        with override_settings(MEDIA_URL="/uploads/"):
+            self.assertTrue(get_excluded_path_matcher().match("/uploads/image.png"))
+            self.assertFalse(get_excluded_path_matcher().match("/media/somewhere/"))
+        self.assertFalse(get_excluded_path_matcher().match(reverse("home")))
+
+    def test_excluded_path_matcher_script_prefix(self):
+        matcher = get_excluded_path_matcher()
+        prefix = get_script_prefix()
+        set_script_prefix("/prefix/")
+        try:
+            self.assertIsNot(matcher, get_excluded_path_matcher())
+            self.assertEqual(
+                get_excluded_path_matcher().url, "/prefix/password/change/"
+            )
+        finally:
+            set_script_prefix(prefix)
+        self.assertIs(matcher, get_excluded_path_matcher())
+
+    @override_settings(
+        PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS=[r"^/(a)/\1/$", r"^/(b)/"]
+    )
+    def test_excluded_path_matcher_backreference(self):
+        matcher = get_excluded_path_matcher()
+        self.assertIsNone(matcher.pattern)
+        self.assertTrue(matcher.match("/a/a/"))
+        self.assertFalse(matcher.match("/a/b/"))
+        self.assertTrue(matcher.match("/b/c/"))
+        self.assertTrue(matcher.match(reverse("password_change")))
+
+    @override_settings(PASSWORD_CHANGE_MIDDLEWARE_EXCLUDED_PATHS=[r"^/$"])
+    def test_password_middleware_excluded_path(self):
+        self.client.login(username="alice", password=passwords[-1])
+        response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 200)
+        self.client.logout()
+
+
+@override_settings(PASSWORD_CHECK_SECONDS=60 ** 2)
+class PasswordPoliciesMiddlewareCheckIntervalTest(TestCase):
+    def setUp(self):
+        seconds = settings.PASSWORD_DURATION_SECONDS - 60
+        self.user = create_user(
+            date_joined=get_datetime_from_delta(timezone.now(), seconds)
+        )
+        self.redirect_url = "http://testserver/password/change/?next=/"
+        self.client.login(username="alice", password=passwords[-1])
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+
+    def expire_password(self):
+        seconds = settings.PASSWORD_DURATION_SECONDS + 60
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            date_joined=get_datetime_from_delta(timezone.now(), seconds)
+        )
+
+    def test_password_middleware_checked_recently(self):
+        self.expire_password()
+        # session and user lookups only
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PASSWORD_CHECK_SECONDS=0)
+    def test_password_middleware_check_every_request(self):
+        self.expire_password()
+        response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
+
+    def test_password_middleware_check_interval_elapsed(self):
+        self.expire_password()
+        later = timezone.now() + timedelta(seconds=settings.PASSWORD_CHECK_SECONDS + 1)
+        with freeze_time(later):
+            response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
+
+    def test_password_middleware_enforced_change_checked_recently(self):
+        PasswordChangeRequired.objects.create(user=self.user)
+        response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    )
+    def test_password_middleware_enforced_change_dummy_cache(self):
+        PasswordChangeRequired.objects.create(user=self.user)
+        response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "failing": {"BACKEND": "password_policies.tests.lib.FailingCache"},
+        },
+        PASSWORD_CACHE_ALIAS="failing",
+    )
+    def test_password_middleware_failing_cache(self):
+        key = settings.PASSWORD_POLICIES_STATUS_VERSION_SESSION_KEY
+        version = self.client.session[key]
+        self.expire_password()
+        # checked recently, but the version can not be compared
+        with self.assertLogs("password_policies.middleware", "WARNING"):
+            response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session[key], version)
+        self.client.logout()
+        self.client.login(username="alice", password=passwords[-1])
+        with self.assertLogs("password_policies.middleware", "WARNING"):
+            self.client.get(reverse("home"), follow=False)
+        self.assertNotIn(key, self.client.session)
+
+
+@override_settings(PASSWORD_CHECK_SECONDS=60 ** 2)
+class PasswordPoliciesCacheCheckTest(TestCase):
+    def test_check_local_memory_cache(self):
+        errors = check_password_cache(None)
+        self.assertEqual([error.id for error in errors], ["password_policies.W001"])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    )
+    def test_check_dummy_cache(self):
+        errors = check_password_cache(None)
+        self.assertEqual([error.id for error in errors], ["password_policies.W001"])
+
+    @override_settings(PASSWORD_CHECK_SECONDS=0)
+    def test_check_every_request(self):
+        self.assertEqual(check_password_cache(None), [])
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": "/tmp/password_policies_tests",
+            }
+        }
+    )
+    def test_check_shared_cache(self):
+        self.assertEqual(check_password_cache(None), [])
+
+    @override_settings(MIDDLEWARE=[])
+    def test_check_without_middleware(self):
+        self.assertEqual(check_password_cache(None), [])
+
+
+class PasswordPoliciesMiddlewareSessionTest(TestCase):
+    def setUp(self):
+        seconds = settings.PASSWORD_DURATION_SECONDS - 60
+        self.user = create_user(
+            date_joined=get_datetime_from_delta(timezone.now(), seconds)
+        )
+        self.client.login(username="alice", password=passwords[-1])
+
+    def count_session_saves(self, count=5, status_code=200):
+        with mock.patch.object(
+            SessionStore, "save", autospec=True, side_effect=SessionStore.save
+        ) as save:
+            for i in range(count):
+                response = self.client.get(reverse("home"))
+                self.assertEqual(response.status_code, status_code)
+        return save.call_count
+
+    @override_settings(PASSWORD_CHECK_SECONDS=0)
+    def test_password_middleware_session_saves(self):
+        # only the first check modifies the session
+        self.assertEqual(self.count_session_saves(), 1)
+
+    @override_settings(PASSWORD_CHECK_SECONDS=0)
+    def test_password_middleware_session_saves_baseline(self):
+        def set_session_value(session, key, value):
+            session[key] = value
+
+        after = self.count_session_saves()
+        # writing values whether they changed or not, as before, saves the
+        # session on every request
+        with mock.patch(
+            "password_policies.middleware.set_session_value", set_session_value
+        ):
+            before = self.count_session_saves()
+        self.assertEqual((before, after), (5, 1))
+
+    @override_settings(PASSWORD_CHECK_SECONDS=0)
+    def test_password_middleware_session_saves_required(self):
+        PasswordChangeRequired.objects.create(user=self.user)
+        self.assertEqual(self.count_session_saves(status_code=302), 1)
+
+    def test_password_middleware_without_interval_skips_cache(self):
+        with mock.patch(
+            "password_policies.middleware.get_status_version"
+        ) as get_status_version:
+            self.assertEqual(self.count_session_saves(), 1)
+        self.assertFalse(get_status_version.called)
+        self.assertNotIn(
+            settings.PASSWORD_POLICIES_STATUS_VERSION_SESSION_KEY, self.client.session
+        )
+
+    @override_settings(PASSWORD_CHECK_SECONDS=0, PASSWORD_CHECK_ONLY_AT_LOGIN=True)
+    def test_password_middleware_session_saves_only_at_login(self):
+        self.assertEqual(self.count_session_saves(), 1)
+
+
+@override_settings(PASSWORD_USE_HISTORY=False, PASSWORD_USE_PROFILE=True)
+class PasswordPoliciesMiddlewareProfileTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.redirect_url = "http://testserver/password/change/?next=/"
+
+    def test_password_middleware_profile(self):
+        self.client.login(username="alice", password=passwords[-1])
+        response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 200)
+        self.client.logout()
+
+    def test_password_middleware_profile_expired(self):
+        PasswordProfile.objects.filter(user=self.user).update(
+            last_changed=self.user.date_joined
+        )
+        self.client.login(username="alice", password=passwords[-1])
+        response = self.client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
+        self.client.logout()
+
+
+class PasswordPoliciesMiddlewareConcurrencyTest(TestCase):
+    count = 16
+
+    def setUp(self):
+        self.middleware = PasswordChangeMiddleware(lambda request: HttpResponse())
+        self.barrier = threading.Barrier(self.count, timeout=10)
+        now = timezone.now()
+        self.statuses = {}
+        for pk in range(1, self.count + 1):
+            # every other user is required to change his/her password
+            last_changed = get_datetime_from_delta(now, pk * 60)
+            self.statuses[pk] = PasswordStatus(pk % 2 == 0, last_changed, now)
+
+    def get_password_status(self, user):
+        # make all requests wait for each other in the middle of the check
+        self.barrier.wait()
+        return self.statuses[user.pk]
+
+    def process_request(self, pk):
+        request = RequestFactory().get("/", {"page": pk})
+        request.user = get_user_model()(pk=pk, username="user%d" % pk)
+        request.session = SessionStore()
+        response = self.middleware.process_request(request)
+        return request, response
+
+    def test_password_middleware_concurrent_requests(self):
+        with mock.patch(
+            "password_policies.middleware.get_password_status",
+            side_effect=self.get_password_status,
+        ):
+            with ThreadPoolExecutor(max_workers=self.count) as executor:
+                results = list(executor.map(self.process_request, self.statuses))
+        for pk, (request, response) in zip(self.statuses, results):
+            session = request.session
+            if pk % 2 == 0:
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(
+                    response["Location"], "/password/change/?next=/?page=%d" % pk
+                )
+                self.assertNotIn(settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY, session)
+            else:
+                self.assertIsNone(response)
+                self.assertFalse(session[settings.PASSWORD_POLICIES_CHANGE_REQUIRED_SESSION_KEY])
+                last = session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
+                self.assertEqual(
+                    timestamp_to_datetime(last), self.statuses[pk].last_changed
+                )
+
+
+@unittest.skipUnless(hasattr(SessionBase, "aget"), "requires Django 5.1 or higher")
+class PasswordPoliciesMiddlewareAsyncTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.redirect_url = "http://testserver/password/change/?next=/"
+        self.client.login(username="alice", password=passwords[-1])
+        self.async_client.cookies = self.client.cookies
+        # fail if the middleware falls back to the synchronous code path
+        patcher = mock.patch.object(
+            PasswordChangeMiddleware, "process_request", side_effect=AssertionError
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_password_middleware_async_capable(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(PasswordChangeMiddleware(get_response)))
+        middleware = PasswordChangeMiddleware(lambda request: HttpResponse())
+        self.assertFalse(iscoroutinefunction(middleware))
+
+    async def test_password_middleware_async_enforced_redirect(self):
+        response = await self.async_client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
+        self.assertTrue(
+            await PasswordChangeRequired.objects.filter(user=self.user).aexists()
+        )
+
+    async def test_password_middleware_async_without_history(self):
+        seconds = settings.PASSWORD_DURATION_SECONDS - 60
+        self.user.date_joined = get_datetime_from_delta(timezone.now(), seconds)
+        await self.user.asave()
+        response = await self.async_client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            await PasswordChangeRequired.objects.filter(user=self.user).aexists()
+        )
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "failing": {"BACKEND": "password_policies.tests.lib.FailingCache"},
+        },
+        PASSWORD_CACHE_ALIAS="failing",
+        PASSWORD_CHECK_SECONDS=60 ** 2,
+    )
+    async def test_password_middleware_async_failing_cache(self):
+        with self.assertLogs("password_policies.middleware", "WARNING"):
+            response = await self.async_client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            await PasswordChangeRequired.objects.filter(user=self.user).aexists()
+        )
+
+    async def test_password_middleware_async_change_required(self):
+        seconds = settings.PASSWORD_DURATION_SECONDS - 60
+        self.user.date_joined = get_datetime_from_delta(timezone.now(), seconds)
+        await self.user.asave()
+        await PasswordChangeRequired.objects.acreate(user=self.user)
+        response = await self.async_client.get(reverse("home"), follow=False)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(get_response_location(response["Location"]), self.redirect_url)
@@ -1,8 +1,32 @@
-from django.test import TestCase
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
 
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password as django_check_password
+from django.db import OperationalError, connection, connections
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from password_policies.cache import get_status_version
 from password_policies.conf import settings
-from password_policies.models import PasswordHistory
-from password_policies.tests.lib import create_password_history, create_user, passwords
+from password_policies.models import (
+    PasswordChangeRequired,
+    PasswordHistory,
+    PasswordProfile,
+)
+from password_policies.tests.lib import (
+    create_password_history,
+    create_user,
+    passwords,
+    without_date_joined,
+)
 
 
 class PasswordHistoryModelTestCase(TestCase):
@@ -22,5 +46,281 @@ class PasswordHistoryModelTestCase(TestCase):
         count = PasswordHistory.objects.filter(user=self.user).count()
         self.assertEqual(count, settings.PASSWORD_HISTORY_COUNT)
 
+    def test_password_history_expiration_single_query(self):
+        with mock.patch("password_policies.models.bump_status_version") as bump:
+            with self.assertNumQueries(1):
+                deleted = PasswordHistory.objects.delete_expired(self.user)
+        self.assertEqual(deleted, len(passwords) - settings.PASSWORD_HISTORY_COUNT)
+        self.assertFalse(bump.called)
+
+    def test_password_history_expiration_same_date(self):
+        PasswordHistory.objects.filter(user=self.user).update(created=timezone.now())
+        newest = list(
+            PasswordHistory.objects.filter(user=self.user)
+            .order_by("-pk")
+            .values_list("pk", flat=True)[:settings.PASSWORD_HISTORY_COUNT]
+        )
+        PasswordHistory.objects.delete_expired(self.user)
+        self.assertEqual(
+            sorted(PasswordHistory.objects.filter(user=self.user).values_list("pk", flat=True)),
+            sorted(newest),
+        )
+
+    def test_password_history_expiration_many(self):
+        user = create_user(username="bob")
+        create_password_history(user, passwords[:3])
+        with self.assertNumQueries(1):
+            deleted = PasswordHistory.objects.delete_expired_many(offset=2)
+        self.assertEqual(deleted, len(passwords) - 2 + 1)
+        self.assertEqual(PasswordHistory.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(PasswordHistory.objects.filter(user=user).count(), 2)
+
+    def test_password_history_expiration_limit(self):
+        deleted = PasswordHistory.objects.delete_expired_many(offset=2, limit=3)
+        self.assertEqual(deleted, 3)
+        expired = PasswordHistory.objects.get_expired(offset=2)
+        self.assertEqual(expired.count(), len(passwords) - 5)
+
+    def test_password_history_expiration_no_users(self):
+        count = PasswordHistory.objects.count()
+        self.assertEqual(PasswordHistory.objects.delete_expired_many([], offset=2), 0)
+        users = get_user_model().objects.none()
+        self.assertEqual(PasswordHistory.objects.delete_expired_many(users, offset=2), 0)
+        self.assertEqual(PasswordHistory.objects.count(), count)
+
     def test_password_history_recent_passwords(self):
         self.assertFalse(PasswordHistory.objects.check_password(self.user, passwords[-1]))
+
+    def test_password_history_status(self):
+        newest = PasswordHistory.objects.get_newest(self.user)
+        with self.assertNumQueries(1):
+            status = PasswordHistory.objects.get_status(self.user)
+        self.assertFalse(status.change_required)
+        self.assertEqual(status.last_changed, newest.created)
+        self.assertTrue(status.is_expired())
+        PasswordChangeRequired.objects.create(user=self.user)
+        with self.assertNumQueries(1):
+            self.assertTrue(PasswordHistory.objects.get_status(self.user).change_required)
+
+    def test_password_history_status_many(self):
+        user = create_user(username="bob")
+        PasswordHistory.objects.filter(user=user).delete()
+        PasswordChangeRequired.objects.create(user=user)
+        with self.assertNumQueries(1):
+            statuses = PasswordHistory.objects.get_status_many([self.user, user.pk, 0])
+        self.assertEqual(
+            statuses,
+            {
+                self.user.pk: PasswordHistory.objects.get_status(self.user),
+                user.pk: PasswordHistory.objects.get_status(user),
+            },
+        )
+        self.assertTrue(statuses[user.pk].change_required)
+        self.assertEqual(statuses[user.pk].last_changed, user.date_joined)
+
+    def test_password_history_status_many_without_date_joined(self):
+        user = create_user(username="bob")
+        PasswordHistory.objects.filter(user=user).delete()
+        with without_date_joined():
+            statuses = PasswordHistory.objects.get_status_many([self.user, user])
+        self.assertEqual(
+            statuses, {self.user.pk: PasswordHistory.objects.get_status(self.user)}
+        )
+
+    def test_password_history_change_required_many(self):
+        users = [self.user] + [create_user(username="user%d" % i) for i in range(4)]
+        PasswordHistory.objects.create(user=users[1], password=users[1].password)
+        with self.assertNumQueries(3):
+            required = PasswordHistory.objects.change_required_many(users, chunk_size=2)
+        self.assertEqual(
+            required, {user.pk: PasswordHistory.objects.change_required(user) for user in users}
+        )
+        self.assertFalse(required[users[1].pk])
+        self.assertTrue(required[users[2].pk])
+        PasswordChangeRequired.objects.create(user=users[1])
+        required = PasswordHistory.objects.change_required_many(users)
+        self.assertTrue(required[users[1].pk])
+        self.assertTrue(PasswordHistory.objects.change_required(users[1]))
+        with self.assertNumQueries(1):
+            queryset = get_user_model().objects.filter(username__startswith="user")
+            required = PasswordHistory.objects.change_required_many(queryset)
+        self.assertEqual(sorted(required), sorted(user.pk for user in users[1:]))
+
+    def test_password_history_status_without_history(self):
+        PasswordHistory.objects.filter(user=self.user).delete()
+        status = PasswordHistory.objects.get_status(self.user)
+        self.assertEqual(status.last_changed, self.user.date_joined)
+        self.assertTrue(PasswordHistory.objects.change_required(self.user))
+
+    @override_settings(PASSWORD_USE_PROFILE=True)
+    def test_password_profile_status(self):
+        profile = PasswordProfile.objects.get(user=self.user)
+        with self.assertNumQueries(1):
+            status = PasswordHistory.objects.get_status(self.user)
+        self.assertEqual(status.last_changed, profile.last_changed)
+        self.assertFalse(status.is_expired())
+        PasswordProfile.objects.filter(user=self.user).update(
+            last_changed=self.user.date_joined
+        )
+        self.assertTrue(PasswordHistory.objects.change_required(self.user))
+
+    def test_password_history_record(self):
+        self.user.set_password("Chah+pher9k")
+        self.user.save()
+        entry = PasswordHistory.objects.record(self.user)
+        self.assertEqual(entry.password, self.user.password)
+        self.assertEqual(PasswordHistory.objects.get_newest(self.user), entry)
+        count = PasswordHistory.objects.filter(user=self.user).count()
+        self.assertEqual(count, settings.PASSWORD_HISTORY_COUNT)
+
+    def test_password_history_record_unusable_password(self):
+        self.user.set_unusable_password()
+        self.assertIsNone(PasswordHistory.objects.record(self.user))
+
+
+@unittest.skipUnless(hasattr(QuerySet, "aget"), "requires Django 4.1 or higher")
+class PasswordHistoryAsyncTestCase(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        create_password_history(self.user, passwords[:4])
+
+    async def test_password_history_acheck_password(self):
+        threads = []
+
+        def check_password(raw_password, encoded):
+            threads.append(threading.current_thread())
+            return django_check_password(raw_password, encoded)
+
+        with mock.patch("password_policies.hashers.check_password", check_password):
+            self.assertFalse(
+                await PasswordHistory.objects.acheck_password(self.user, passwords[-1])
+            )
+        # the event loop's thread has not been blocked
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertFalse(
+            await PasswordHistory.objects.acheck_password(self.user, passwords[1])
+        )
+        self.assertTrue(
+            await PasswordHistory.objects.acheck_password(self.user, passwords[5])
+        )
+
+    async def test_password_history_aget_newest(self):
+        from asgiref.sync import sync_to_async
+
+        newest = await sync_to_async(PasswordHistory.objects.get_newest)(self.user)
+        self.assertEqual(await PasswordHistory.objects.aget_newest(self.user), newest)
+        await PasswordHistory.objects.filter(user=self.user).adelete()
+        self.assertIsNone(await PasswordHistory.objects.aget_newest(self.user))
+
+    async def test_password_history_achange_required(self):
+        self.assertTrue(await PasswordHistory.objects.achange_required(self.user))
+        await PasswordHistory.objects.acreate(user=self.user, password="testpass")
+        self.assertFalse(await PasswordHistory.objects.achange_required(self.user))
+
+    async def test_password_history_adelete_expired(self):
+        self.assertEqual(
+            await PasswordHistory.objects.adelete_expired(self.user, offset=1), 3
+        )
+        self.assertEqual(
+            await PasswordHistory.objects.filter(user=self.user).acount(), 1
+        )
+
+
+class PasswordChangeRequiredModelTestCase(TestCase):
+    def setUp(self):
+        self.user = create_user()
+
+    @override_settings(PASSWORD_USE_STATUS_CACHE=True)
+    def test_password_change_required_enforce(self):
+        version = get_status_version(self.user.pk)
+        with self.assertNumQueries(1):
+            PasswordChangeRequired.objects.enforce(self.user)
+        self.assertTrue(PasswordChangeRequired.objects.filter(user=self.user).exists())
+        self.assertGreater(get_status_version(self.user.pk), version)
+
+    def test_password_change_required_enforce_existing(self):
+        required = PasswordChangeRequired.objects.create(user=self.user)
+        with self.assertNumQueries(1):
+            PasswordChangeRequired.objects.enforce(self.user)
+        self.assertEqual(
+            list(PasswordChangeRequired.objects.filter(user=self.user)), [required]
+        )
+
+    def test_password_change_required_enforce_many(self):
+        users = [self.user, create_user(username="bob")]
+        PasswordChangeRequired.objects.enforce(self.user)
+        with self.assertNumQueries(1):
+            PasswordChangeRequired.objects.enforce_many(users)
+        self.assertEqual(PasswordChangeRequired.objects.count(), 2)
+
+
+class PasswordChangeRequiredConcurrencyTestCase(TransactionTestCase):
+    count = 8
+
+    def setUp(self):
+        self.user = create_user()
+        self.barrier = threading.Barrier(self.count, timeout=10)
+
+    def enforce(self, i):
+        try:
+            self.barrier.wait()
+            for attempt in range(10):
+                try:
+                    PasswordChangeRequired.objects.enforce(self.user)
+                    return
+                except OperationalError as e:
+                    # SQLite's shared in-memory database locks tables
+                    # instead of waiting for concurrent writers.
+                    if "locked" not in str(e) or attempt == 9:
+                        raise
+                    time.sleep(0.01)
+        finally:
+            connections.close_all()
+
+    def test_password_change_required_enforce_concurrently(self):
+        with ThreadPoolExecutor(max_workers=self.count) as executor:
+            list(executor.map(self.enforce, range(self.count * 4)))
+        self.assertEqual(
+            PasswordChangeRequired.objects.filter(user=self.user).count(), 1
+        )
+
+
+class PasswordProfileMigrationTestCase(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        create_password_history(self.user)
+        self.newest = PasswordHistory.objects.get_newest(self.user)
+        self.migration = import_module(
+            "password_policies.migrations.0004_backfill_passwordprofile"
+        )
+        return super(PasswordProfileMigrationTestCase, self).setUp()
+
+    def backfill_password_profiles(self):
+        schema_editor = connection.schema_editor()
+        self.migration.backfill_password_profiles(apps, schema_editor)
+
+    def test_backfill_password_profile(self):
+        PasswordProfile.objects.filter(user=self.user).update(
+            last_changed=self.user.date_joined
+        )
+        self.backfill_password_profiles()
+        profile = PasswordProfile.objects.get(user=self.user)
+        self.assertEqual(profile.last_changed, self.newest.created)
+
+    def test_backfill_password_profile_newer(self):
+        profile = PasswordProfile.objects.get(user=self.user)
+        self.backfill_password_profiles()
+        self.assertEqual(
+            PasswordProfile.objects.get(user=self.user).last_changed,
+            profile.last_changed,
+        )
+
+    def test_backfill_missing_password_profiles(self):
+        PasswordProfile.objects.all().delete()
+        user = create_user(username="bob", email="bob@example.com")
+        PasswordProfile.objects.filter(user=user).delete()
+        self.backfill_password_profiles()
+        profile = PasswordProfile.objects.get(user=self.user)
+        self.assertEqual(profile.last_changed, self.newest.created)
+        profile = PasswordProfile.objects.get(user=user)
+        self.assertEqual(profile.last_changed, user.date_joined)
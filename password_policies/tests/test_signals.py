@@ -1,7 +1,17 @@
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
 
-from password_policies.models import PasswordProfile, password_change_signal
+from password_policies.models import (
+    PasswordChangeRequired,
+    PasswordHistory,
+    PasswordProfile,
+    password_change_signal,
+)
 
 
 class TestSignals(TestCase):
@@ -15,3 +25,83 @@ class TestSignals(TestCase):
 
     def test_password_created_signal(self):
         PasswordProfile.objects.get(user=self.user)
+
+    @override_settings(PASSWORD_HISTORY_RECORD_ON_SAVE=True)
+    def test_password_history_signal(self):
+        self.user.first_name = "Foo"
+        self.user.save()
+        self.assertFalse(PasswordHistory.objects.filter(user=self.user).exists())
+        self.user.set_password("Chah+pher9k")
+        self.user.save()
+        entry = PasswordHistory.objects.get(user=self.user)
+        self.assertEqual(entry.password, self.user.password)
+
+    def test_password_history_signal_disabled(self):
+        self.user.set_password("Chah+pher9k")
+        self.user.save()
+        self.assertFalse(PasswordHistory.objects.filter(user=self.user).exists())
+
+
+@override_settings(
+    PASSWORD_HASHERS=[
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ],
+)
+class TestPasswordRehashSignals(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="foo", password=make_password("Chah+pher9k", hasher="pbkdf2_sha1")
+        )
+        self.last_changed = timezone.now() - timedelta(days=365)
+        PasswordProfile.objects.filter(user=self.user).update(
+            last_changed=self.last_changed
+        )
+
+    def test_password_rehash_keeps_last_changed(self):
+        self.assertTrue(self.user.check_password("Chah+pher9k"))
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+        profile = PasswordProfile.objects.get(user=self.user)
+        self.assertEqual(profile.last_changed, self.last_changed)
+
+    @override_settings(PASSWORD_HISTORY_RECORD_ON_SAVE=True)
+    def test_password_rehash_not_recorded(self):
+        self.assertTrue(self.user.check_password("Chah+pher9k"))
+        self.assertFalse(PasswordHistory.objects.filter(user=self.user).exists())
+        self.user.set_password("la]ePhae1Ies")
+        self.user.save(update_fields=["password"])
+        self.assertEqual(PasswordHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_password_change_updates_last_changed(self):
+        self.user.set_password("la]ePhae1Ies")
+        self.user.save(update_fields=["password"])
+        profile = PasswordProfile.objects.get(user=self.user)
+        self.assertGreater(profile.last_changed, self.last_changed)
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "failing": {"BACKEND": "password_policies.tests.lib.FailingCache"},
+    },
+    PASSWORD_CACHE_ALIAS="failing",
+)
+class TestSignalsWithoutCache(TestCase):
+    def test_user_writes_without_cache(self):
+        user = User.objects.create_user(username="foo", password="foo")
+        user.set_password("bar")
+        user.save()
+        PasswordChangeRequired.objects.enforce(user)
+        PasswordChangeRequired.objects.enforce_many([user])
+        PasswordChangeRequired.objects.filter(user=user).delete()
+        user.delete()
+
+    @override_settings(PASSWORD_USE_STATUS_CACHE=True)
+    def test_user_writes_with_failing_cache(self):
+        user = User.objects.create_user(username="foo", password="foo")
+        with self.assertLogs("password_policies.cache", "WARNING"):
+            PasswordChangeRequired.objects.enforce(user)
+        self.assertTrue(PasswordChangeRequired.objects.filter(user=user).exists())
+        with self.assertLogs("password_policies.cache", "WARNING"):
+            PasswordChangeRequired.objects.filter(user=user).delete()
+        self.assertFalse(PasswordChangeRequired.objects.filter(user=user).exists())
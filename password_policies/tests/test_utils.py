@@ -1,8 +1,32 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
 
-from password_policies.models import PasswordChangeRequired, PasswordHistory
-from password_policies.tests.lib import create_password_history, create_user
-from password_policies.utils import PasswordCheck
+from password_policies.cache import (
+    get_cache,
+    get_status_version,
+    get_status_version_key,
+)
+from password_policies.models import (
+    PasswordChangeRequired,
+    PasswordHistory,
+    PasswordProfile,
+)
+from password_policies.tests.lib import (
+    create_password_history,
+    create_user,
+    without_date_joined,
+)
+from password_policies.utils import (
+    PasswordCheck,
+    datetime_to_timestamp,
+    get_password_status,
+    timestamp_to_datetime,
+    with_password_status,
+)
 
 
 class PasswordPoliciesUtilsTest(TestCase):
@@ -28,3 +52,152 @@ class PasswordPoliciesUtilsTest(TestCase):
         # now we create a password now, so it isn't expired
         PasswordHistory.objects.create(user=self.user, password="testpass")
         self.assertFalse(self.check.is_expired())
+
+
+class PasswordStatusAnnotationTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        create_password_history(self.user)
+        self.other = create_user(username="bob")
+        PasswordHistory.objects.create(user=self.other, password="testpass")
+        PasswordChangeRequired.objects.create(user=self.other)
+        self.users = with_password_status(get_user_model().objects.order_by("pk"))
+
+    def test_with_password_status(self):
+        for user in self.users:
+            status = PasswordHistory.objects.get_status(user)
+            self.assertEqual(user.password_last_changed, status.last_changed)
+            self.assertEqual(user.password_expires_at, status.expires_at)
+            self.assertEqual(user.password_expired, status.is_expired())
+            self.assertEqual(user.password_change_enforced, status.change_required)
+
+    def test_with_password_status_filter(self):
+        self.assertEqual(list(self.users.filter(password_expired=True)), [self.user])
+        self.assertEqual(
+            list(self.users.filter(password_change_enforced=True)), [self.other]
+        )
+        self.assertEqual(
+            list(self.users.order_by("-password_expires_at")), [self.other, self.user]
+        )
+
+    def test_with_password_status_without_history(self):
+        PasswordHistory.objects.all().delete()
+        user = self.users.get(pk=self.user.pk)
+        self.assertEqual(user.password_last_changed, self.user.date_joined)
+
+    def test_with_password_status_without_date_joined(self):
+        PasswordHistory.objects.filter(user=self.user).delete()
+        with without_date_joined():
+            users = list(with_password_status(get_user_model().objects.order_by("pk")))
+        self.assertIsNone(users[0].password_last_changed)
+        self.assertIsNone(users[0].password_expires_at)
+        self.assertFalse(users[0].password_expired)
+        status = PasswordHistory.objects.get_status(self.other)
+        self.assertEqual(users[1].password_last_changed, status.last_changed)
+
+    @override_settings(PASSWORD_USE_PROFILE=True)
+    def test_with_password_status_profile(self):
+        profile = PasswordProfile.objects.get(user=self.user)
+        users = with_password_status(get_user_model().objects.filter(pk=self.user.pk))
+        self.assertEqual(users.get().password_last_changed, profile.last_changed)
+
+
+@override_settings(PASSWORD_USE_STATUS_CACHE=True)
+class PasswordStatusCacheTest(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = create_user()
+        create_password_history(self.user)
+        return super(PasswordStatusCacheTest, self).setUp()
+
+    def test_password_status_cached(self):
+        status = get_password_status(self.user)
+        self.assertFalse(status.change_required)
+        self.assertTrue(status.is_expired())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_password_status(self.user), status)
+
+    def test_password_status_change_required(self):
+        self.assertFalse(get_password_status(self.user).change_required)
+        p = PasswordChangeRequired.objects.create(user=self.user)
+        self.assertTrue(get_password_status(self.user).change_required)
+        p.delete()
+        self.assertFalse(get_password_status(self.user).change_required)
+
+    def test_password_status_version_evicted(self):
+        key = get_status_version_key(self.user.pk)
+        get_cache().delete(key)
+        self.assertFalse(get_password_status(self.user).change_required)
+        version = get_status_version(self.user.pk)
+        PasswordChangeRequired.objects.enforce(self.user)
+        self.assertTrue(get_password_status(self.user).change_required)
+        # The version is lost, e.g. evicted or the cache restarted, the
+        # status cached before the enforcement must not be reused.
+        get_cache().delete(key)
+        self.assertNotEqual(get_status_version(self.user.pk), version)
+        self.assertTrue(get_password_status(self.user).change_required)
+        get_cache().delete(key)
+        PasswordChangeRequired.objects.filter(user=self.user).delete()
+        self.assertFalse(get_password_status(self.user).change_required)
+
+    def test_password_status_history(self):
+        self.assertTrue(get_password_status(self.user).is_expired())
+        PasswordHistory.objects.create(user=self.user, password="testpass")
+        self.assertFalse(get_password_status(self.user).is_expired())
+
+    def test_password_status_profile(self):
+        status = get_password_status(self.user)
+        PasswordProfile.objects.filter(user=self.user).get().save()
+        # the cached status has been invalidated
+        with self.assertNumQueries(1):
+            self.assertEqual(get_password_status(self.user), status)
+
+
+class PasswordPoliciesTimestampTest(TestCase):
+    @override_settings(USE_TZ=True)
+    def test_timestamp_aware(self):
+        value = datetime(2021, 7, 21, 17, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        self.assertEqual(datetime_to_timestamp(value), 1626886800123456)
+        self.assertEqual(timestamp_to_datetime(1626886800123456), value)
+
+    @override_settings(USE_TZ=False, TIME_ZONE="Europe/Warsaw")
+    def test_timestamp_naive(self):
+        value = datetime(2021, 7, 21, 19, 0, 0, 123456)
+        self.assertEqual(datetime_to_timestamp(value), 1626886800123456)
+        self.assertEqual(timestamp_to_datetime(1626886800123456), value)
+
+    @override_settings(USE_TZ=False, TIME_ZONE="Europe/Warsaw")
+    def test_timestamp_naive_dst_transitions(self):
+        # repeated when the clocks go back
+        value = datetime(2021, 10, 31, 2, 30)
+        self.assertEqual(timestamp_to_datetime(datetime_to_timestamp(value)), value)
+        # skipped when the clocks go forward
+        value = datetime(2021, 3, 28, 2, 30)
+        self.assertEqual(
+            timestamp_to_datetime(datetime_to_timestamp(value)),
+            datetime(2021, 3, 28, 3, 30),
+        )
+
+    @override_settings(USE_TZ=True, TIME_ZONE="Europe/Warsaw")
+    def test_timestamp_legacy_string_dst_transition(self):
+        value = timestamp_to_datetime("2021-10-31T02:30:00.000000")
+        self.assertEqual(
+            timezone.make_naive(value), datetime(2021, 10, 31, 2, 30)
+        )
+
+    def test_timestamp_now(self):
+        for use_tz in (True, False):
+            with override_settings(USE_TZ=use_tz):
+                now = timezone.now()
+                value = timestamp_to_datetime(datetime_to_timestamp(now))
+                self.assertEqual(value, now)
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_timestamp_legacy_strings(self):
+        aware = datetime(2021, 7, 21, 17, 0, tzinfo=dt_timezone.utc)
+        naive = datetime(2021, 7, 21, 17, 0)
+        for value in ("2021-07-21T17:00:00.000000+0000", "2021-07-21T17:00:00.000000"):
+            with override_settings(USE_TZ=True):
+                self.assertEqual(timestamp_to_datetime(value), aware)
+            with override_settings(USE_TZ=False):
+                self.assertEqual(timestamp_to_datetime(value), naive)
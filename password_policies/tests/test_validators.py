@@ -0,0 +1,225 @@
+import os
+import random
+import tempfile
+from unittest import mock
+
+from django.apps import apps
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from password_policies.forms.similarity import (
+    CompiledIndex,
+    QGramIndex,
+    clear_dictionary_indexes,
+    get_dictionary_index,
+    get_max_distance,
+    substring_distance,
+    write_compiled_dictionary,
+)
+from password_policies.forms.validators import (
+    BaseSimilarityValidator,
+    DictionaryValidator,
+)
+
+
+def dp_substring_distance(needle, haystack):
+    # The dynamic programming implementation substring_distance() replaced.
+    row1 = [0] * (len(haystack) + 1)
+    for i in range(0, len(needle)):
+        row2 = [i + 1]
+        for j in range(0, len(haystack)):
+            cost = needle[i] != haystack[j]
+            row2.append(min(row1[j + 1] + 1, row2[j] + 1, row1[j] + cost))
+        row1 = row2
+    return min(row1)
+
+
+class RandomStringMixin:
+    alphabet = "abcdeAB1"
+
+    def random_string(self, rng, low, high):
+        return "".join(
+            rng.choice(self.alphabet) for _ in range(rng.randint(low, high))
+        )
+
+
+class SubstringDistanceTest(RandomStringMixin, SimpleTestCase):
+    def test_substring_distance(self):
+        self.assertEqual(substring_distance("password", "my password"), 0)
+        self.assertEqual(substring_distance("passw0rd", "password"), 1)
+        self.assertEqual(substring_distance("password", "pass"), 4)
+        self.assertEqual(substring_distance("", "pass"), 0)
+        self.assertEqual(substring_distance("pass", ""), 4)
+
+    def test_substring_distance_matches_dp(self):
+        rng = random.Random(22)
+        for _ in range(2000):
+            needle = self.random_string(rng, 0, 70)
+            haystack = self.random_string(rng, 0, 30)
+            expected = dp_substring_distance(needle, haystack)
+            self.assertEqual(
+                substring_distance(needle, haystack), expected, (needle, haystack)
+            )
+            max_distance = rng.randint(-1, len(needle))
+            distance = substring_distance(needle, haystack, max_distance)
+            if expected <= max_distance:
+                self.assertEqual(distance, expected, (needle, haystack))
+            else:
+                self.assertGreater(distance, max_distance, (needle, haystack))
+
+    def test_fuzzy_substring(self):
+        validator = BaseSimilarityValidator()
+        self.assertEqual(validator.fuzzy_substring("PassWord", "my password"), 0)
+        self.assertEqual(validator.fuzzy_substring("x", "password"), -1)
+        self.assertEqual(validator.fuzzy_substring("password", ""), 8)
+
+
+class QGramIndexTest(RandomStringMixin, SimpleTestCase):
+
+    def get_matches(self, validator, needle, haystacks, threshold):
+        matches = []
+        for haystack in haystacks:
+            distance = validator.fuzzy_substring(needle, haystack)
+            longest = max(len(needle), len(haystack))
+            if (longest - distance) / longest >= threshold:
+                matches.append(haystack)
+        return matches
+
+    def test_get_max_distance(self):
+        self.assertEqual(get_max_distance(10, 10, 0.9), 1)
+        self.assertEqual(get_max_distance(10, 10, 0.0), 10)
+        self.assertEqual(get_max_distance(10, 3, 0.0), 3)
+        self.assertEqual(get_max_distance(9, 9, 0.9), 0)
+
+    def test_candidates_match_linear_scan(self):
+        rng = random.Random(20)
+        validator = BaseSimilarityValidator()
+        words = [self.random_string(rng, 0, 12) for _ in range(300)]
+        index = QGramIndex(words)
+        for threshold in (0.5, 0.7, 0.9, 1.0):
+            for _ in range(100):
+                needle = self.random_string(rng, 1, 14)
+                candidates = index.get_candidates(needle, threshold)
+                matches = self.get_matches(validator, needle, words, threshold)
+                self.assertTrue(set(matches) <= set(candidates), needle)
+
+    def test_candidates_keep_order(self):
+        index = QGramIndex(["Password", "", "dragon", "passwort"])
+        self.assertEqual(
+            index.get_candidates("password", 0.8), ["Password", "", "passwort"]
+        )
+        self.assertEqual(index.get_candidates("x", 0.8), index.words)
+
+
+class CompiledIndexTest(RandomStringMixin, SimpleTestCase):
+    def compile(self, words):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "wb") as compiled:
+            write_compiled_dictionary(words, compiled)
+        return path
+
+    def test_candidates_match_plain_index(self):
+        rng = random.Random(25)
+        words = [self.random_string(rng, 0, 12) for _ in range(300)]
+        compiled = CompiledIndex(self.compile(words), ["Password"])
+        unique = sorted(dict.fromkeys(word.lower() for word in words if word), key=len)
+        index = QGramIndex(unique + ["Password"])
+        self.assertEqual(list(compiled.words), index.words)
+        for threshold in (0.5, 0.9):
+            for _ in range(100):
+                needle = self.random_string(rng, 0, 14)
+                self.assertEqual(
+                    list(compiled.get_candidates(needle, threshold)),
+                    list(index.get_candidates(needle, threshold)),
+                    needle,
+                )
+
+    def test_compiled_dictionary_validator(self):
+        path = self.compile(["Dragon", "monkey", "münchen"])
+        validator = DictionaryValidator(dictionary=path, words=["secret"])
+        self.assertIsInstance(validator.index, CompiledIndex)
+        for password in ("DRAGON", "München", "secret"):
+            with self.assertRaises(ValidationError):
+                validator(password)
+        validator("correct horse")
+
+
+class DictionaryValidatorTest(SimpleTestCase):
+    def test_dictionary_validator(self):
+        validator = DictionaryValidator(words=["Dragon", "password", "monkey"])
+        with self.assertRaises(ValidationError):
+            validator("PASSWORD")
+        with self.assertRaises(ValidationError):
+            validator("dragon")
+        validator("correct horse")
+
+    def test_dictionary_validator_reports_match(self):
+        validator = DictionaryValidator(words=["Dragon", "password", "monkey"])
+        with self.assertRaises(ValidationError) as cm:
+            validator("monkey")
+        self.assertEqual(cm.exception.params, {"haystacks": "monkey"})
+        self.assertEqual(
+            cm.exception.messages, ["The new password is based on a dictionary word."]
+        )
+
+    @override_settings(PASSWORD_MATCH_THRESHOLD=0.5)
+    def test_dictionary_validator_threshold(self):
+        validator = DictionaryValidator(words=["password"])
+        with self.assertRaises(ValidationError):
+            validator("passXXXX")
+
+
+class DictionaryLoadingTest(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.write(["dragon", "monkey"], 1000000000)
+        clear_dictionary_indexes()
+        self.addCleanup(clear_dictionary_indexes)
+
+    def write(self, words, mtime):
+        with open(self.path, "w") as dictionary:
+            dictionary.write("\n".join(words))
+        os.utime(self.path, ns=(mtime, mtime))
+
+    def test_dictionary_loaded_lazily(self):
+        with mock.patch(
+            "password_policies.forms.similarity.read_dictionary"
+        ) as read_dictionary:
+            DictionaryValidator(dictionary=self.path)
+        self.assertFalse(read_dictionary.called)
+
+    def test_dictionary_shared(self):
+        first = DictionaryValidator(dictionary=self.path, words=["password"])
+        second = DictionaryValidator(dictionary=self.path, words=["password"])
+        self.assertIs(first.index, second.index)
+        self.assertEqual(first.haystacks, ["dragon", "monkey", "password"])
+        third = DictionaryValidator(dictionary=self.path, words=["secret"])
+        self.assertIsNot(first.index, third.index)
+
+    def test_dictionary_reloaded_when_modified(self):
+        validator = DictionaryValidator(dictionary=self.path, words=["password"])
+        index = validator.index
+        with self.assertRaises(ValidationError):
+            validator("Dragon")
+        self.write(["letmein"], 2000000000)
+        self.assertIsNot(validator.index, index)
+        validator("Dragon")
+        with self.assertRaises(ValidationError):
+            validator("letmein")
+
+    def test_dictionary_preload(self):
+        config = apps.get_app_config("password_policies")
+        with mock.patch(
+            "password_policies.forms.validators.get_dictionary_index",
+            wraps=get_dictionary_index,
+        ) as get_index:
+            config.ready()
+            self.assertFalse(get_index.called)
+            with override_settings(PASSWORD_DICTIONARY_PRELOAD=True):
+                config.ready()
+        self.assertTrue(get_index.called)
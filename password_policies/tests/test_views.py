@@ -12,7 +12,7 @@ from password_policies.conf import settings
 from password_policies.forms import PasswordPoliciesChangeForm
 from password_policies.models import PasswordHistory
 from password_policies.tests.lib import create_user, passwords
-from password_policies.utils import string_to_datetime, datetime_to_string
+from password_policies.utils import datetime_to_timestamp, timestamp_to_datetime
 
 from freezegun import freeze_time
 
@@ -139,20 +139,20 @@ class PasswordChangeViewsTestCase(TestCase):
         session = self.client.session
 
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
+                         1626904800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
                          timezone.now())
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
+                         1626904800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
                          timezone.now())
 
     @skipIf(DJANGO_VERSION >= (5, 0), 'PickleSerializer not supported in this version')
@@ -169,20 +169,20 @@ class PasswordChangeViewsTestCase(TestCase):
         session = self.client.session
 
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
                          timezone.now())
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
                          timezone.now())
 
     @skipIf(DJANGO_VERSION >= (5, 0), 'PickleSerializer not supported in this version')
@@ -199,20 +199,20 @@ class PasswordChangeViewsTestCase(TestCase):
         session = self.client.session
 
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
                          timezone.now())
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
                          timezone.now())
 
     @override_settings(SESSION_SERIALIZER='django.contrib.sessions.serializers.JSONSerializer', USE_TZ=False)
@@ -228,20 +228,20 @@ class PasswordChangeViewsTestCase(TestCase):
         session = self.client.session
 
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
+                         1626904800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
                          timezone.now())
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
+                         1626904800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
                          timezone.now())
 
     @override_settings(SESSION_SERIALIZER='django.contrib.sessions.serializers.JSONSerializer', USE_TZ=True)
@@ -257,20 +257,20 @@ class PasswordChangeViewsTestCase(TestCase):
         session = self.client.session
 
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
                          timezone.now())
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
                          timezone.now())
 
 
@@ -287,20 +287,20 @@ class PasswordChangeViewsTestCase(TestCase):
         session = self.client.session
 
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHECKED_SESSION_KEY]),
                          timezone.now())
         # Assert session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]
-        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], str)
+        self.assertIsInstance(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY], int)
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         datetime_to_string(timezone.now()))
+                         datetime_to_timestamp(timezone.now()))
         self.assertEqual(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY],
-                         "2021-07-21T17:00:00.000000+0000")
-        self.assertEqual(string_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
+                         1626886800000000)
+        self.assertEqual(timestamp_to_datetime(session[settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY]),
                          timezone.now())
 
 
@@ -1,13 +1,118 @@
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone as dt_timezone
 
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import (
+    BooleanField,
+    Case,
+    DateTimeField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.conf import settings as django_settings
-from django.core.exceptions import ObjectDoesNotExist
 
+from password_policies.cache import (
+    aget_cached_status,
+    aget_status_version,
+    aset_cached_status,
+    get_cached_status,
+    get_status_version,
+    set_cached_status,
+)
 from password_policies.conf import settings
 from password_policies.models import PasswordHistory
 
 
+def get_password_status(user):
+    """
+    Gets the password status of a user.
+
+    If :py:attr:`~password_policies.conf.Settings.PASSWORD_USE_STATUS_CACHE`
+    is set to ``True`` the status is read from the cache if possible.
+
+    :arg user: A :class:`~django.contrib.auth.models.User` instance.
+    :returns: A :class:`~password_policies.managers.PasswordStatus` instance."""
+    if not settings.PASSWORD_USE_STATUS_CACHE:
+        return PasswordHistory.objects.get_status(user)
+    # Read the version before querying the database, so a change made
+    # in the meantime is not cached under the current version.
+    version = get_status_version(user.pk)
+    status = get_cached_status(user.pk, version)
+    if status is None:
+        status = PasswordHistory.objects.get_status(user)
+        set_cached_status(user.pk, version, status)
+    return status
+
+
+async def aget_password_status(user):
+    "Asynchronous version of :func:`get_password_status`."
+    if not settings.PASSWORD_USE_STATUS_CACHE:
+        return await PasswordHistory.objects.aget_status(user)
+    version = await aget_status_version(user.pk)
+    status = await aget_cached_status(user.pk, version)
+    if status is None:
+        status = await PasswordHistory.objects.aget_status(user)
+        await aset_cached_status(user.pk, version, status)
+    return status
+
+
+def with_password_status(queryset, now=None):
+    """
+    Annotates a queryset of users with their password status, computed by
+    the database:
+
+    - ``password_last_changed``: The date and time the password was last
+      changed, see
+      :meth:`~password_policies.managers.PasswordHistoryManager.get_status`.
+    - ``password_expires_at``: The date and time the password expires.
+    - ``password_expired``: ``True`` if the password has expired.
+    - ``password_change_enforced``: ``True`` if a password change is
+      enforced.
+
+    The annotations can be used to filter and order users, e.g.::
+
+        with_password_status(User.objects.all()).filter(password_expired=True)
+
+    If the user model has no ``date_joined`` field, ``password_last_changed``
+    and ``password_expires_at`` are ``None`` and ``password_expired`` is
+    ``False`` for users without a known password change.
+
+    :arg queryset: A queryset of :class:`~django.contrib.auth.models.User`
+      instances.
+    :arg now: The date and time to check the expiry against. Defaults to now.
+    :returns: The annotated queryset."""
+    if now is None:
+        now = timezone.now()
+    newest, required = PasswordHistory.objects.get_status_subqueries()
+    try:
+        queryset.model._meta.get_field("date_joined")
+    except FieldDoesNotExist:
+        last_changed = newest
+    else:
+        last_changed = Coalesce(newest, F("date_joined"))
+    duration = timedelta(seconds=settings.PASSWORD_DURATION_SECONDS)
+    return queryset.annotate(
+        password_last_changed=last_changed,
+        password_change_enforced=required,
+    ).annotate(
+        password_expires_at=ExpressionWrapper(
+            F("password_last_changed") + Value(duration, output_field=DurationField()),
+            output_field=DateTimeField(),
+        ),
+    ).annotate(
+        password_expired=Case(
+            # Compare against a constant to keep the filter simple.
+            When(password_last_changed__lt=now - duration, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+
+
 class PasswordCheck(object):
     "Checks if a given user needs to change his/her password."
 
@@ -25,12 +130,7 @@ exists the verification is successful.
     ``False`` otherwise.
 :rtype: bool
 """
-        try:
-            if self.user.password_change_required:
-                return True
-        except ObjectDoesNotExist:
-            pass
-        return False
+        return get_password_status(self.user).change_required
 
     def is_expired(self):
         """Checks if a given user's password has expired.
@@ -39,22 +139,101 @@ exists the verification is successful.
     ``False`` otherwise.
 :rtype: bool
 """
-        if PasswordHistory.objects.change_required(self.user):
-            return True
-        return False
+        return get_password_status(self.user).is_expired()
 
     def get_expiry_datetime(self):
         "Returns the date and time when the user's password has expired."
         seconds = settings.PASSWORD_DURATION_SECONDS
         return timezone.now() - timedelta(seconds=seconds)
 
+def set_session_value(session, key, value):
+    """
+    Stores a value in a session unless it is stored already.
+
+    Assigning a value marks a session as modified, which makes Django save it
+    at the end of the request even if the value did not change.
+
+    :arg session: A session instance.
+    :arg str key: The session key.
+    :arg value: The value to store.
+    :returns: ``True`` if the session has been modified, ``False`` otherwise.
+    :rtype: bool"""
+    if key in session and session[key] == value:
+        return False
+    session[key] = value
+    return True
+
+
+#: The date and time timestamps are counted from.
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+#: The formats used by :func:`datetime_to_string` by default.
+DATETIME_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S.%f")
+
+
+def _make_aware(value):
+    # timezone.make_aware() raises for times skipped or repeated by a DST
+    # transition with pytz, which is used before Django 4.0, and has no
+    # is_dst argument since Django 5.0.
+    tz = timezone.get_default_timezone()
+    if hasattr(tz, "localize"):
+        return tz.localize(value, is_dst=False)
+    return value.replace(tzinfo=tz)
+
+
+def datetime_to_timestamp(value):
+    """ Transform datetime object in an integer of microseconds since
+the epoch, a compact representation to store in sessions.
+
+Naive datetime objects are assumed to be in the default time zone.
+
+:returns: microseconds since the epoch
+:rtype: int
+"""
+    if timezone.is_naive(value):
+        value = _make_aware(value)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def timestamp_to_datetime(value):
+    """ Transform an integer of microseconds since the epoch in a datetime
+object, aware if ``USE_TZ`` is set, naive in the default time zone if not.
+
+Strings created by :func:`datetime_to_string`, as stored in sessions
+by previous versions, are accepted as well.
+
+:returns: datetime
+:rtype: datetime
+"""
+    if isinstance(value, datetime):
+        pass
+    elif isinstance(value, str):
+        for format in DATETIME_FORMATS:
+            try:
+                value = datetime.strptime(value, format)
+            except ValueError:
+                continue
+            break
+        else:
+            raise ValueError("Invalid date and time: %r" % value)
+    else:
+        value = EPOCH + timedelta(microseconds=value)
+
+    if django_settings.USE_TZ:
+        if timezone.is_naive(value):
+            value = _make_aware(value)
+    elif timezone.is_aware(value):
+        value = timezone.make_naive(value)
+    return value
+
+
 def datetime_to_string(value, format=None):
     """ Transform datetime object in a string with input format
 :returns: formatted datetime
 :rtype: str
 """
     if format is None:
-        format = "%Y-%m-%dT%H:%M:%S.%f%z" if django_settings.USE_TZ else "%Y-%m-%dT%H:%M:%S.%f"
+        format = DATETIME_FORMATS[0] if django_settings.USE_TZ else DATETIME_FORMATS[1]
 
     if not isinstance(value, str):
         return datetime.strftime(value, format)
@@ -67,7 +246,7 @@ def string_to_datetime(value, format=None):
 :rtype: datetime
 """
     if format is None:
-        format = "%Y-%m-%dT%H:%M:%S.%f%z" if django_settings.USE_TZ else "%Y-%m-%dT%H:%M:%S.%f"
+        format = DATETIME_FORMATS[0] if django_settings.USE_TZ else DATETIME_FORMATS[1]
 
     if not isinstance(value, datetime):
         return datetime.strptime(value, format)
@@ -34,7 +34,7 @@ from password_policies.forms import (
     PasswordPoliciesForm,
     PasswordResetForm,
 )
-from password_policies.utils import string_to_datetime, datetime_to_string
+from password_policies.utils import datetime_to_timestamp, set_session_value
 
 class LoggedOutMixin(View):
     """
@@ -114,11 +114,12 @@ class PasswordChangeFormView(FormView):
         last = settings.PASSWORD_POLICIES_LAST_CHANGED_SESSION_KEY
         required = settings.PASSWORD_POLICIES_CHANGE_REQUIRED_SESSION_KEY
         now = timezone.now()
-        now_str = datetime_to_string(now)
+        now_timestamp = datetime_to_timestamp(now)
 
-        self.request.session[checked] = now_str
-        self.request.session[last] = now_str
-        self.request.session[required] = False
+        session = self.request.session
+        set_session_value(session, checked, now_timestamp)
+        set_session_value(session, last, now_timestamp)
+        set_session_value(session, required, False)
         redirect_to = self.request.POST.get(self.redirect_field_name, "")
         if redirect_to:
             url = redirect_to